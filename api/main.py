@@ -2,20 +2,38 @@
 FastAPI WebSocket Server for HFT Trading Platform
 Provides REST API + WebSocket for real-time price streaming
 """
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query, Depends, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, FileResponse, Response, ORJSONResponse
 import asyncio
 import logging
+import time
 from datetime import datetime
 from pathlib import Path
-import json
+from typing import Any, Dict, List, Optional, Protocol, Set, TYPE_CHECKING
+import weakref
+import orjson
+from pydantic import BaseModel
+
+from core import config
+from core.market_data import market_data, iso_now, compress_frame
 
-from core.market_data import market_data
+if TYPE_CHECKING:
+    from core.oms.order_manager import OrderManager
+    from core.oms.position_manager import PositionManager
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Bank Nifty HFT API", version="1.0.0")
+# orjson-backed responses for every endpoint (also encodes datetime natively)
+app = FastAPI(
+    title="Bank Nifty HFT API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
+
+# Symbol dicts repeat the same keys; compress anything non-trivial
+app.add_middleware(GZipMiddleware, minimum_size=512, compresslevel=5)
 
 # Serve static files (frontend)
 # Resolve path relative to this file (api/main.py) -> parent (project root) -> frontend
@@ -23,15 +41,110 @@ project_root = Path(__file__).parent.parent
 frontend_path = project_root / "frontend"
 static_path = frontend_path / "static"
 
-if not static_path.exists():
-    logger.error(f"Static path does not exist: {static_path}")
-    # Create it if missing to avoid startup crash
-    static_path.mkdir(parents=True, exist_ok=True)
+# check_dir=False: a missing directory just 404s instead of crashing startup,
+# and import does no filesystem work
+app.mount("/static", StaticFiles(directory=str(static_path), check_dir=False), name="static")
+
+class _Connection:
+    """A streaming client: its socket and outbound frame queue"""
+    __slots__ = ("websocket", "queue", "__weakref__")
+    
+    def __init__(self, websocket: WebSocket, queue: asyncio.Queue):
+        self.websocket = websocket
+        self.queue = queue
+
+# Active WebSocket connections: id(conn) -> _Connection, held weakly. Only the
+# handler holds a connection strongly, so an entry vanishes with its handler
+# even if cleanup never runs; `finally` still removes it promptly
+active_connections: "weakref.WeakValueDictionary[int, _Connection]" = weakref.WeakValueDictionary()
+
+# Per-client send timeout (seconds) so one stuck socket cannot stall its writer
+SEND_TIMEOUT = 2.0
+
+# Max queued outbound messages per client before the oldest are dropped
+WS_QUEUE_SIZE = 256
+
+# Window (seconds) over which bursts of updates are merged into one frame
+COALESCE_WINDOW = 0.005
+
+# Seconds between full-state reconcile frames sent to every client
+RECONCILE_INTERVAL = 30.0
+
+# Seconds between connection stats log lines
+STATS_INTERVAL = 5.0
+
+# Connection churn counters; reported by stats_loop instead of logging each event
+connection_stats = {"opened": 0, "closed": 0, "errors": 0}
+
+# Keepalive / latency frames, serialized once
+PING_FRAME = b'{"type":"ping"}'
+PONG_FRAME = b'pong'
+
+# Polled price data must never be served from a browser/proxy cache
+NO_STORE = {"Cache-Control": "no-store"}
+
+# Request bodies
+class OrderRequest(BaseModel):
+    symbol: str
+    side: str # BUY, SELL
+    qty: int
+    price: float = 0.0
+    product_type: str = 'I' # Default to MIS
+
+class GTTRequest(BaseModel):
+    symbol: str
+    side: str
+    qty: int
+    trigger_price: float
+    product_type: str = 'I'
+
+class EngineProtocol(Protocol):
+    """What the API needs from the trading engine (core.feed.TickEngine sets all of
+    these in __init__, so handlers only need a single None check)"""
+    instrument_mgr: Any
+    position_manager: "PositionManager"
+    order_manager: "OrderManager"
+    order_history: List[dict]
+    auto_trading_enabled: bool
+    
+    def place_manual_order(self, symbol: str, side: str, qty: int, price: float = 0.0, product_type: str = 'I') -> dict: ...
+    def cancel_order(self, order_id: str) -> dict: ...
+    def place_gtt_order(self, symbol: str, side: str, qty: int, trigger_price: float, product_type: str = 'I') -> dict: ...
+
+# Multi-worker mode (see launch_web.py): this process is a uvicorn worker and the
+# engine runs in the launcher process, which only shares prices with us over Redis
+FANOUT = bool(config.REDIS_URL) and config.API_WORKERS > 1
+
+def engine_process_only():
+    """Dependency for state-changing endpoints: in fanout mode a worker's change
+    would never reach the engine (or the other workers), so refuse it"""
+    if FANOUT:
+        raise HTTPException(
+            status_code=503,
+            detail="Not available with multiple API workers: the trading engine runs in the launcher process"
+        )
 
-app.mount("/static", StaticFiles(directory=str(static_path)), name="static")
+# Running TickEngine, cached on app.state; None until the bot has created it
+app.state.engine = None
 
-# Active WebSocket connections
-active_connections: set = set()
+def set_engine(engine):
+    """Register (or replace) the engine the API talks to"""
+    app.state.engine = engine
+
+def _launcher_engine():
+    """Engine created by the launcher module (imported lazily to avoid a circular import)"""
+    import main
+    return main.active_engine
+
+async def get_engine() -> Optional[EngineProtocol]:
+    """Dependency: the running TickEngine (or None before it starts)"""
+    engine = app.state.engine
+    if engine is None:
+        # The bot thread may finish starting after the web server; adopt it once it exists
+        engine = _launcher_engine()
+        if engine is not None:
+            set_engine(engine)
+    return engine
 
 @app.get("/")
 async def serve_dashboard():
@@ -46,36 +159,36 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": time.time(),
         "active_connections": len(active_connections),
-        "symbols_tracked": len(market_data.get_latest_prices())
+        "symbols_tracked": len(market_data.latest_prices)
     }
 
 @app.get("/api/prices")
 async def get_all_prices():
     """Get latest prices for all symbols (REST)"""
-    return {
-        "prices": market_data.get_latest_prices(),
-        "timestamp": datetime.now().isoformat()
-    }
+    # Pre-built body, re-encoded only when prices change
+    return Response(
+        content=market_data.cached_prices_json(),
+        media_type="application/json",
+        headers=NO_STORE
+    )
+
+# Endpoints that may block (SQLite, broker REST calls, engine internals) are
+# plain `def` so FastAPI runs them in its threadpool instead of on the event loop;
+# in-memory handlers stay `async def`.
 
 @app.get("/api/config")
-async def get_config():
+def get_config(engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Get configuration (Lot sizes, etc)"""
     try:
-        from main import active_engine
         config = {
             "lot_sizes": {},
             "risk": {}
         }
-        if active_engine:
-             # Lot Sizes
-             if hasattr(active_engine, 'instrument_mgr'):
-                 config["lot_sizes"] = active_engine.instrument_mgr.lot_size_map
-             
-             # Risk Config
-             if hasattr(active_engine, 'position_manager'):
-                 config["risk"] = active_engine.position_manager.risk_config
+        if engine is not None:
+            config["lot_sizes"] = engine.instrument_mgr.lot_size_map
+            config["risk"] = engine.position_manager.risk_config
         
         return config
     except Exception as e:
@@ -83,24 +196,18 @@ async def get_config():
         return {"error": str(e)}
 
 @app.get("/api/positions")
-async def get_positions():
+async def get_positions(engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Get current positions and P&L"""
     try:
-        from main import active_engine
-        if active_engine and hasattr(active_engine, 'position_manager'):
+        if engine is not None:
             # Trigger P&L update with latest prices before returning
-            pm = active_engine.position_manager
-            pm.update_pnl(market_data.latest_prices)
+            pm = engine.position_manager
+            prices = market_data.get_latest_prices()
+            # update_pnl walks every position and runs TSL checks; keep it off the event loop
+            total_unrealized = await asyncio.to_thread(pm.update_pnl, prices)
             
-            # Convert tuple keys (symbol, product) to strings for JSON
-            serializable_positions = {}
-            for (sym, prd), pos in pm.positions.items():
-                price_data = market_data.latest_prices.get(sym, {})
-                pos_data = pos.copy()
-                pos_data['ltp'] = price_data.get('ltp', pos['avg_price'])
-                serializable_positions[f"{sym}:{prd}"] = pos_data
-            
-            total_unrealized = sum(p['unrealized_pnl'] for p in pm.positions.values())
+            # Tuple keys (symbol, product) become "SYMBOL:PRODUCT" strings for JSON
+            serializable_positions = pm.serialize_positions(prices)
             
             return {
                 "positions": serializable_positions,
@@ -111,26 +218,25 @@ async def get_positions():
         return {"error": str(e)}
 
 @app.get("/api/orders")
-async def get_orders(date: str = None):
+def get_orders(date: str = None, engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Get recent order history and logs, optionally filtered by date (YYYY-MM-DD)"""
     try:
         from core.database import db
         if date:
             return {"orders": db.get_orders_by_date(date)}
             
-        from main import active_engine
-        if active_engine and hasattr(active_engine, 'order_history'):
-            if not active_engine.order_history:
+        if engine is not None:
+            if not engine.order_history:
                 # If in-memory is empty, try loading from DB
                 return {"orders": db.get_recent_orders()}
-            return {"orders": active_engine.order_history}
+            return {"orders": engine.order_history}
         return {"orders": db.get_recent_orders()}
     except Exception as e:
         logger.error(f"API Orders Error: {e}")
         return {"error": str(e)}
 
-@app.post("/api/orders/clear")
-async def clear_orders(date: str = Query(...)):
+@app.post("/api/orders/clear", dependencies=[Depends(engine_process_only)])
+def clear_orders(date: str = Query(...), engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Clear order history for a specific date"""
     try:
         from core.database import db
@@ -139,9 +245,8 @@ async def clear_orders(date: str = Query(...)):
         # Also clear in-memory history if it's for today
         today = datetime.now().strftime("%Y-%m-%d")
         if date == today:
-            from main import active_engine
-            if active_engine and hasattr(active_engine, 'order_history'):
-                active_engine.order_history = []
+            if engine is not None:
+                engine.order_history = []
                 
         return {"status": "success", "message": f"History for {date} cleared"}
     except Exception as e:
@@ -149,54 +254,50 @@ async def clear_orders(date: str = Query(...)):
         return {"status": "error", "message": str(e)}
 
 
-@app.get("/api/mode")
-async def get_trading_mode():
-    """Get the current trading mode (Real or Paper)"""
-    from core import config
+def _load_trading_mode():
+    """Restore the persisted trading mode into config (once, at startup)"""
     from core.database import db
-    # Sync with DB if available
     db_mode = db.get_state("paper_trading_mode")
     if db_mode is not None:
         config.PAPER_TRADING_MODE = (db_mode == "True")
+
+@app.get("/api/mode")
+async def get_trading_mode():
+    """Get the current trading mode (Real or Paper)"""
+    # config is the source of truth: loaded from the DB at startup, updated by POST
     return {"paper_trading_mode": config.PAPER_TRADING_MODE}
 
-@app.post("/api/mode")
-async def set_trading_mode(paper_mode: bool = Query(...)):
+@app.post("/api/mode", dependencies=[Depends(engine_process_only)])
+def set_trading_mode(paper_mode: bool = Query(...)):
     """Update the trading mode dynamically (Real or Paper)"""
-    from core import config
     from core.database import db
     config.PAPER_TRADING_MODE = paper_mode
     db.save_state("paper_trading_mode", paper_mode)
     logger.warning(f"🔄 Trading mode changed to: {'PAPER' if paper_mode else 'REAL'}")
     return {"status": "success", "paper_trading_mode": config.PAPER_TRADING_MODE}
 @app.get("/api/auto_trade")
-async def get_auto_trade():
+async def get_auto_trade(engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Get the current AI Auto-Trading status"""
-    from main import active_engine
-    enabled = False
-    if active_engine and hasattr(active_engine, 'auto_trading_enabled'):
-        enabled = active_engine.auto_trading_enabled
+    enabled = engine.auto_trading_enabled if engine is not None else False
     return {"auto_trading_enabled": enabled}
 
-@app.post("/api/auto_trade")
-async def set_auto_trade(enabled: bool = Query(...)):
+@app.post("/api/auto_trade", dependencies=[Depends(engine_process_only)])
+def set_auto_trade(enabled: bool = Query(...), engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Toggle AI Auto-Trading status"""
-    from main import active_engine
     from core.database import db
-    if active_engine and hasattr(active_engine, 'auto_trading_enabled'):
-        active_engine.auto_trading_enabled = enabled
+    if engine is not None:
+        engine.auto_trading_enabled = enabled
         db.save_state("auto_trading_enabled", enabled)
         logger.info(f"🔄 AI Auto-Trading {'ENABLED' if enabled else 'DISABLED'}")
         return {"status": "success", "auto_trading_enabled": enabled}
     return {"status": "error", "message": "Engine not ready"}
 
 @app.get("/api/risk")
-async def get_risk_config():
+def get_risk_config(engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Get risk configuration"""
     try:
-        from main import active_engine
-        if active_engine and hasattr(active_engine, 'position_manager'):
-            return active_engine.position_manager.risk_config
+        if engine is not None:
+            return engine.position_manager.risk_config
         return {}
     except Exception as e:
         return {"error": str(e)}
@@ -205,8 +306,6 @@ async def get_risk_config():
 async def get_symbol_price(symbol: str):
     """Get latest price for specific symbol"""
     price_data = market_data.get_price(symbol.upper())
-    if not price_data:
-        return {"error": "Symbol not found", "symbol": symbol}
     if not price_data:
         return {"error": "Symbol not found", "symbol": symbol}
     return price_data
@@ -224,97 +323,81 @@ async def control_bot(action: str):
     
     return {"status": "success", "action": action, "message": f"Signal {action} received"}
 
+# Running simulations, one per symbol
+_sim_tasks: Dict[str, asyncio.Task] = {}
+
 @app.post("/api/simulate")
 async def start_simulation(symbol: str = "SBIN"):
     """Start simulating ticks for a symbol (for visualization test)"""
     logger.info(f"Starting simulation for {symbol}")
     
+    # Replace any simulation already running for this symbol
+    previous = _sim_tasks.get(symbol)
+    if previous is not None:
+        previous.cancel()
+    
     # Run simulation in background
-    asyncio.create_task(_simulate_ticker(symbol))
+    _sim_tasks[symbol] = asyncio.create_task(_simulate_ticker(symbol))
     
     return {"status": "started", "symbol": symbol}
 
+# Simulated ticks generated per numpy batch
+SIM_BATCH = 1024
+
+def _random_walk(start: float):
+    """Yield (price, volume) ticks of a random walk, generated SIM_BATCH at a time"""
+    import numpy as np
+    rng = np.random.default_rng()
+    price = start
+    while True:
+        prices = price + rng.uniform(-1, 1, SIM_BATCH).cumsum()
+        volumes = rng.integers(100, 10000, SIM_BATCH, endpoint=True)
+        price = float(prices[-1])
+        # tolist() hands back plain Python floats/ints for the payload
+        yield from zip(prices.tolist(), volumes.tolist())
+
 async def _simulate_ticker(symbol: str):
     """Background task to generate fake ticks"""
-    import random
-    price = 1000.0
-    
-    # Add dummy macro data for visualization
-    # We need to access the TickEngine instance ideally, but here we just update market_data
-    # For full simulation we might want to update macro_data in feed if possible
-    # For now, just price updates
+    # Fields that never change are set once; only the moving ones are rewritten per tick
+    payload = {
+        'symbol': symbol,
+        'open': 1000.0,
+        'macro': {'trend': 'BULLISH', 'rsi': '60.5'}, # Fake Macro
+    }
     
     try:
-        while True:
-            # Random Walk
-            change = random.uniform(-1, 1)
-            price += change
+        for price, volume in _random_walk(1000.0):
+            payload['ltp'] = round(price, 2)
+            payload['volume'] = volume
+            payload['high'] = round(price + 5, 2)
+            payload['low'] = round(price - 5, 2)
+            payload['change'] = round(price - 1000.0, 2)
+            payload['vwap'] = round(price - 1, 2)
+            payload['trend'] = "BULLISH" if price > 1000 else "BEARISH"
+            payload['timestamp'] = iso_now()
             
-            payload = {
-                'symbol': symbol,
-                'ltp': round(price, 2),
-                'volume': random.randint(100, 10000),
-                'open': 1000.0,
-                'high': round(price + 5, 2),
-                'low': round(price - 5, 2),
-                'change': round(price - 1000.0, 2),
-                'vwap': round(price - 1, 2),
-                'trend': "BULLISH" if price > 1000 else "BEARISH",
-                'macro': {'trend': 'BULLISH', 'rsi': '60.5'}, # Fake Macro
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            # Update market data which triggers websocket
-            if hasattr(market_data, 'latest_prices'):
-                market_data.latest_prices[symbol] = payload
-            
-            # Fire update to subscribers
-            # Since market_data.latest_prices set item triggers subscribers if implemented
-            # Let's check market_data implementation
-            # It seems market_data is just a dict? No, it has notify/subscribe?
-            # Let's look at core/market_data.py to be sure. 
-            # Assuming market_data.latest_prices is a CustomDict or we need to call notify explicitly.
-            # Based on previous logs: "New subscriber added", "Subscriber removed"
-            # It likely has observer pattern.
-            
-            # Let's explicitly notify if possible, or assume setting latest_prices does it.
-            # Note: The websocket endpoint adds a callback to market_data.
-            # We need to make sure market_data calls it.
-            
-            # Wait 500ms
-            await asyncio.sleep(0.5)
+            # Publish to market data, which wakes the broadcaster
+            market_data.publish(symbol, payload)
             
             # Wait 500ms
             await asyncio.sleep(0.5)
             
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        logger.error(f"Simulation error: {e}")
-
-from pydantic import BaseModel
-
-class OrderRequest(BaseModel):
-    symbol: str
-    side: str # BUY, SELL
-    qty: int
-    price: float = 0.0
-    product_type: str = 'I' # Default to MIS
-
-class GTTRequest(BaseModel):
-    symbol: str
-    side: str
-    qty: int
-    trigger_price: float
-    product_type: str = 'I'
+        logger.error("Simulation error: %s", e)
+    finally:
+        if _sim_tasks.get(symbol) is asyncio.current_task():
+            del _sim_tasks[symbol]
 
-@app.post("/api/order")
-async def place_order(order: OrderRequest):
+@app.post("/api/order", dependencies=[Depends(engine_process_only)])
+def place_order(order: OrderRequest, engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Place a manual order"""
     try:
-        from main import active_engine
-        if not active_engine:
+        if not engine:
             return {"status": "error", "message": "Trading Engine not ready"}
             
-        result = active_engine.place_manual_order(
+        result = engine.place_manual_order(
             symbol=order.symbol.upper(),
             side=order.side.upper(),
             qty=order.qty,
@@ -326,26 +409,24 @@ async def place_order(order: OrderRequest):
         logger.error(f"API Order Error: {e}")
         return {"status": "error", "message": str(e)}
 
-@app.post("/api/order/cancel")
-async def cancel_order(order_id: str = Query(...)):
+@app.post("/api/order/cancel", dependencies=[Depends(engine_process_only)])
+def cancel_order(order_id: str = Query(...), engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Cancel an active order"""
     try:
-        from main import active_engine
-        if not active_engine:
+        if not engine:
             return {"status": "error", "message": "Trading Engine not ready"}
-        return active_engine.cancel_order(order_id)
+        return engine.cancel_order(order_id)
     except Exception as e:
         logger.error(f"API Cancel Error: {e}")
         return {"status": "error", "message": str(e)}
 
-@app.post("/api/order/gtt")
-async def place_gtt(order: GTTRequest):
+@app.post("/api/order/gtt", dependencies=[Depends(engine_process_only)])
+def place_gtt(order: GTTRequest, engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Place a GTT order"""
     try:
-        from main import active_engine
-        if not active_engine:
+        if not engine:
             return {"status": "error", "message": "Trading Engine not ready"}
-        return active_engine.place_gtt_order(
+        return engine.place_gtt_order(
             symbol=order.symbol.upper(),
             side=order.side.upper(),
             qty=order.qty,
@@ -356,15 +437,14 @@ async def place_gtt(order: GTTRequest):
         logger.error(f"API GTT Error: {e}")
         return {"status": "error", "message": str(e)}
 
-@app.post("/api/panic")
-async def panic_exit():
+@app.post("/api/panic", dependencies=[Depends(engine_process_only)])
+async def panic_exit(engine: Optional[EngineProtocol] = Depends(get_engine)):
     """Close ALL positions immediately"""
     try:
-        from main import active_engine
-        if not active_engine:
+        if not engine:
             return {"status": "error", "message": "Engine not running"}
             
-        await active_engine.order_manager.close_all_positions()
+        await engine.order_manager.close_all_positions()
         return {"status": "success", "message": "Panic Exit Triggered"}
     except Exception as e:
         logger.error(f"Panic Exit Error: {e}")
@@ -375,7 +455,8 @@ async def debug_prices():
     """Debug endpoint to check backend market data state"""
     from core.market_data import market_data
     prices = market_data.get_latest_prices()
-    logger.info(f"DEBUG: /api/debug/prices called. Items: {len(prices)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("/api/debug/prices called. Items: %d", len(prices))
     return {
         "count": len(prices),
         "items": list(prices.values()),
@@ -388,31 +469,22 @@ async def debug_prices():
 async def websocket_prices(websocket: WebSocket):
     """WebSocket endpoint for real-time price streaming"""
     await websocket.accept()
-    active_connections.add(websocket)
-    
-    # Create callback for this connection
-    async def send_update(symbol: str, data: dict):
-        """Send price update to this WebSocket client"""
-        try:
-            await websocket.send_json({
-                "type": "price_update",
-                "symbol": symbol,
-                "data": data
-            })
-        except Exception as e:
-            logger.error(f"Error sending to WebSocket: {e}")
+    connection_stats["opened"] += 1
     
-    # Subscribe to market data
-    market_data.subscribe(send_update)
+    # Outbound messages go through a bounded queue drained by a single writer,
+    # so the broadcaster never awaits this client's socket
+    queue: asyncio.Queue = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+    writer = asyncio.create_task(_writer(websocket, queue))
+    conn = _Connection(websocket, queue)
+    cid = id(conn)
     
     try:
         # Send initial snapshot
-        initial_data = market_data.get_latest_prices()
-        await websocket.send_json({
-            "type": "snapshot",
-            "data": initial_data,
-            "timestamp": datetime.now().isoformat()
-        })
+        _enqueue(queue, _snapshot_frame())
+        
+        # Register for broadcasts
+        active_connections[cid] = conn
+        market_data.set_ws_clients(len(active_connections))
         
         # Keep connection alive and handle incoming messages
         while True:
@@ -422,60 +494,184 @@ async def websocket_prices(websocket: WebSocket):
                 
                 # Handle ping for latency measurement
                 if message == "ping":
-                    await websocket.send_text("pong")
+                    _enqueue(queue, PONG_FRAME)
                     
             except asyncio.TimeoutError:
                 # Send keepalive ping
-                await websocket.send_json({"type": "ping"})
+                _enqueue(queue, PING_FRAME)
                 
     except WebSocketDisconnect:
-        logger.info("WebSocket client disconnected")
+        pass
     except Exception as e:
-        logger.error(f"WebSocket error: {e}")
+        connection_stats["errors"] += 1
+        logger.debug("WebSocket error: %s", e)
     finally:
         # Cleanup
-        market_data.unsubscribe(send_update)
-        active_connections.discard(websocket)
-        logger.info(f"Connection closed. Active: {len(active_connections)}")
+        active_connections.pop(cid, None)
+        market_data.set_ws_clients(len(active_connections))
+        writer.cancel()
+        connection_stats["closed"] += 1
+
+def _enqueue(queue: asyncio.Queue, message):
+    """Non-blocking put that keeps memory bounded.
+    
+    Deltas only make sense applied in order, so on overflow the whole backlog
+    is replaced by a fresh snapshot (followed by the new message).
+    """
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_snapshot_frame())
+        queue.put_nowait(message)
+
+async def _writer(websocket: WebSocket, queue: asyncio.Queue):
+    """Single writer per connection: drains pre-serialized frames onto the socket"""
+    try:
+        while True:
+            frame = await queue.get()
+            await asyncio.wait_for(websocket.send_bytes(frame), timeout=SEND_TIMEOUT)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error("Error sending to WebSocket: %s", e)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize on startup"""
     logger.info("FastAPI HFT server starting...")
-    # Start background broadcaster
-    asyncio.create_task(broadcast_loop())
+    await asyncio.to_thread(_load_trading_mode)
+    
+    # Price updates are pushed to clients as they are published
+    market_data.attach_loop(asyncio.get_running_loop(), _on_tick)
+    asyncio.create_task(reconcile_loop())
+    asyncio.create_task(stats_loop())
+    
+    # Multi-worker mode: ticks arrive from the bot process over Redis
+    if FANOUT:
+        asyncio.create_task(redis_subscribe_loop())
+
+async def reconcile_loop():
+    """Background task: periodically resend full state so clients heal any drift
+    left by skipped timestamp-only deltas"""
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL)
+        if not active_connections:
+            continue
+        try:
+            frame = _snapshot_frame("reconcile")
+            for conn in list(active_connections.values()):
+                _enqueue(conn.queue, frame)
+        except Exception as e:
+            logger.error("Reconcile loop error: %s", e)
 
-async def broadcast_loop():
-    """Background task to poll for updates and broadcast"""
-    last_broadcast = {}
+async def stats_loop():
+    """Background task: log connection counts every STATS_INTERVAL, when they change"""
+    last = None
+    while True:
+        await asyncio.sleep(STATS_INTERVAL)
+        current = (len(active_connections), connection_stats["opened"],
+                   connection_stats["closed"], connection_stats["errors"])
+        if current != last:
+            logger.info("WebSocket connections active=%d opened=%d closed=%d errors=%d", *current)
+            last = current
+
+# Tick broadcaster state; only touched on the event loop
+_pending_symbols: Set[str] = set()
+_flush_handle: Optional[asyncio.TimerHandle] = None
+_last_sent_versions: Dict[str, int] = {}
+_last_sent_fields: Dict[str, dict] = {}
+
+def _snapshot_frame(frame_type: str = "snapshot") -> bytes:
+    """Full-state frame for a client that connects or resyncs.
+    
+    The snapshot may carry values no delta has sent yet, so the delta
+    bookkeeping is reset and the next delta repeats every field; otherwise a
+    value that changes and then reverts would never reach that client.
+    """
+    _last_sent_versions.clear()
+    _last_sent_fields.clear()
+    return market_data.snapshot_frame(frame_type)
+
+def _on_tick(symbol: str):
+    """market_data callback: mark a symbol dirty and schedule a coalesced flush.
+    
+    Updates arriving within COALESCE_WINDOW of the first one are merged into a
+    single frame, with no background task waking up while the market is idle.
+    """
+    global _flush_handle
+    _pending_symbols.add(symbol)
+    if _flush_handle is None:
+        _flush_handle = asyncio.get_running_loop().call_later(COALESCE_WINDOW, _flush_ticks)
+
+def _flush_ticks():
+    """Push one delta frame covering every symbol updated since the last flush.
+    
+    A symbol is only sent when its version has moved since the last frame, and
+    then only the fields that changed (see encode_delta); clients merge deltas
+    into the snapshot they received on connect.
+    """
+    global _flush_handle
+    _flush_handle = None
+    pending = list(_pending_symbols)
+    _pending_symbols.clear()
+    
+    try:
+        versions = market_data.symbol_versions
+        prices = market_data.latest_prices
+        batch = {}
+        for symbol in pending:
+            version = versions[symbol]
+            if _last_sent_versions.get(symbol) != version:
+                _last_sent_versions[symbol] = version
+                batch[symbol] = prices[symbol]
+        frame = market_data.encode_delta(batch, _last_sent_fields) if batch else None
+        if frame is None:
+            return
+        frame = compress_frame(frame)
+        
+        for conn in list(active_connections.values()):
+            _enqueue(conn.queue, frame)
+    except Exception as e:
+        logger.error("Broadcast error: %s", e)
+
+async def redis_subscribe_loop():
+    """Background task: feed this worker's market data from the Redis ticks channel.
+    
+    Each worker fans out only to its own clients, so broadcast load is split
+    across workers. Reconnects after a short pause if Redis drops.
+    """
+    import redis.asyncio as aioredis
     
     while True:
         try:
-            # Get current snapshot
-            current_prices = market_data.get_latest_prices()
-            
-            # Check for changes
-            for symbol, data in current_prices.items():
-                last_time = last_broadcast.get(symbol, {}).get('timestamp')
-                curr_time = data.get('timestamp')
-                
-                # If timestamp changed, broadcast
-                if curr_time != last_time:
-                    # Broadcast to all connected clients
-                    await market_data.broadcast(symbol, data)
-                    last_broadcast[symbol] = data
-            
-            # Poll every 50ms (20 FPS)
-            await asyncio.sleep(0.05)
+            client = aioredis.from_url(config.REDIS_URL)
+            pubsub = client.pubsub()
+            await pubsub.subscribe(config.REDIS_TICKS_CHANNEL)
+            logger.info("Subscribed to Redis channel '%s'", config.REDIS_TICKS_CHANNEL)
             
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                tick = orjson.loads(message["data"])
+                market_data.publish_local(tick["symbol"], tick["data"])
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"Broadcast loop error: {e}")
-            await asyncio.sleep(1)
+            logger.error("Redis subscriber error: %s", e)
+            await asyncio.sleep(1.0)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("FastAPI HFT server shutting down...")
-    # Close all WebSocket connections
-    for ws in active_connections.copy():
-        await ws.close()
+    # Close all WebSocket connections concurrently; one dead socket must not stall the rest
+    await asyncio.gather(
+        *(conn.websocket.close() for conn in list(active_connections.values())),
+        return_exceptions=True
+    )
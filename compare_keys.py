@@ -33,7 +33,11 @@ else:
 import hashlib
 
 def get_hash(uid, key):
-    return hashlib.sha256((uid + "|" + key).encode()).hexdigest()
+    # Feed the parts incrementally instead of building the joined string first
+    h = hashlib.sha256(uid.encode())
+    h.update(b"|")
+    h.update(key.encode())
+    return h.hexdigest()
 
 hash_quant = get_hash(user_quant, key_quant)
 hash_nifty = get_hash(user_nifty, key_nifty)
@@ -1,12 +1,24 @@
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Callable
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Dict, List, Optional, Callable, Tuple, Union
 from dataclasses import dataclass
 import logging
 
+from core.jit import njit
+
 logger = logging.getLogger(__name__)
 
-@dataclass
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
+_NS_PER_MIN = 60 * 1_000_000_000
+
+# Forming-bar state exchanged with the bulk kernel
+_BUCKET, _VOL, _COUNT, _ACTIVE = range(4)       # int64 state
+_OPEN, _HIGH, _LOW, _CLOSE = range(4)           # float64 state
+
+@dataclass(slots=True)
 class Candle:
     timestamp: datetime
     open: float
@@ -16,80 +28,285 @@ class Candle:
     volume: int
     complete: bool = False
 
+@njit('i8(i8[:],f8[:],i8[:],i8,i8,i8[:],f8[:],f8[:],f8[:],f8[:],i8[:],i8[:],f8[:])', cache=True)
+def _resample_nb(tick_ts, tick_px, tick_vol, interval_ns, offset_ns, ts, o, h, l, c, v, cur_i, cur_f):
+    """
+    Fold a batch of ticks into the ring, same rules as CandleResampler._process.
+    Buckets are aligned to local wall-clock time (`offset_ns` = UTC offset).
+    Returns the number of bars completed.
+    """
+    cap = ts.shape[0]
+    completed = 0
+    for k in range(tick_ts.shape[0]):
+        ts_ns = tick_ts[k]
+        price = tick_px[k]
+        bucket = ts_ns - (ts_ns + offset_ns) % interval_ns
+
+        if cur_i[_ACTIVE] == 1 and bucket <= cur_i[_BUCKET]:
+            if price > cur_f[_HIGH]:
+                cur_f[_HIGH] = price
+            elif price < cur_f[_LOW]:
+                cur_f[_LOW] = price
+            cur_f[_CLOSE] = price
+            cur_i[_VOL] += tick_vol[k]
+            continue
+
+        if cur_i[_ACTIVE] == 1:
+            i = cur_i[_COUNT] % cap
+            ts[i] = cur_i[_BUCKET]
+            o[i] = cur_f[_OPEN]
+            h[i] = cur_f[_HIGH]
+            l[i] = cur_f[_LOW]
+            c[i] = cur_f[_CLOSE]
+            v[i] = cur_i[_VOL]
+            cur_i[_COUNT] += 1
+            completed += 1
+
+        cur_i[_ACTIVE] = 1
+        cur_i[_BUCKET] = bucket
+        cur_i[_VOL] = tick_vol[k]
+        cur_f[_OPEN] = price
+        cur_f[_HIGH] = price
+        cur_f[_LOW] = price
+        cur_f[_CLOSE] = price
+    return completed
+
 class CandleResampler:
-    def __init__(self, interval_minutes: int):
+    """
+    Tick -> OHLCV resampler.
+
+    Completed bars live in six preallocated NumPy columns (struct-of-arrays)
+    used as a ring buffer of `capacity` bars. The forming bar is a fixed set of
+    scalar slots, so a live tick costs a few local compares and stores and
+    allocates nothing. Batches of ticks (backfill, replay) go through
+    `process_ticks`, which loops in the `_resample_nb` kernel (JIT-compiled
+    when numba is available). `Candle` objects are only built as views when a
+    bar is returned to the caller.
+    """
+    __slots__ = (
+        'interval', 'interval_ns', 'capacity',
+        '_ts', '_o', '_h', '_l', '_c', '_v', '_n',
+        '_active', '_cur_bucket', '_cur_o', '_cur_h', '_cur_l', '_cur_c', '_cur_v',
+        '_tz', '_offset_ns', '_last_min_key', '_last_min_ns',
+    )
+
+    def __init__(self, interval_minutes: int, capacity: int = 4096, tz: Optional[tzinfo] = None):
         self.interval = interval_minutes
-        self.current_candle: Optional[Candle] = None
-        self.candles: List[Candle] = []
-        
-    def process_tick(self, price: float, volume: int, timestamp: datetime) -> Optional[Candle]:
+        self.interval_ns = interval_minutes * _NS_PER_MIN
+        self.capacity = capacity
+
+        # Completed bars (slot = n % capacity)
+        self._ts = np.empty(capacity, dtype='i8')   # bucket start, epoch ns
+        self._o = np.empty(capacity, dtype='f8')
+        self._h = np.empty(capacity, dtype='f8')
+        self._l = np.empty(capacity, dtype='f8')
+        self._c = np.empty(capacity, dtype='f8')
+        self._v = np.empty(capacity, dtype='i8')
+        self._n = 0  # total bars completed this session
+
+        # Forming bar
+        self._active = False
+        self._cur_bucket = 0
+        self._cur_o = self._cur_h = self._cur_l = self._cur_c = 0.0
+        self._cur_v = 0
+
+        # Timezone buckets are aligned to; taken from the first tick when ticks
+        # are datetimes, must be given here when ticks are epoch-ns ints
+        self._tz = tz
+        self._offset_ns = datetime.now(tz).utcoffset() // _ONE_US * 1000 if tz is not None else 0
+
+        # Last seen tick minute -> its epoch-ns
+        self._last_min_key = -1
+        self._last_min_ns = 0
+
+    def process_tick(self, price: float, volume: int, timestamp: Union[datetime, int, np.integer]) -> Optional[Candle]:
         """
         Process a new tick and return a completed candle if a new bar starts.
         Returns None if the candle is still forming.
+        `timestamp` is a datetime or an int epoch-ns (e.g. time.time_ns(), or a numpy
+        integer from a tick array); integers go straight to the integer bucketing without building any datetime.
         """
-        # Calculate the bucket start time for this tick
-        # Example: 10:04:15 with 5min interval -> 10:00:00
-        minute_floor = (timestamp.minute // self.interval) * self.interval
-        bucket_start = timestamp.replace(minute=minute_floor, second=0, microsecond=0)
-        
-        completed_candle = None
+        if isinstance(timestamp, (int, np.integer)):
+            return self._process(timestamp, price, volume)
+
+        # Buckets are whole minutes, so only the tick's minute matters. Consecutive
+        # ticks almost always share it: reuse the last minute's epoch-ns instead of
+        # redoing the (tz-aware) datetime arithmetic on every tick.
+        min_key = (((timestamp.year * 13 + timestamp.month) * 32 + timestamp.day) * 24
+                   + timestamp.hour) * 60 + timestamp.minute
+        if min_key != self._last_min_key:
+            self._last_min_key = min_key
+            self._last_min_ns = self._minute_ns(timestamp)
+        return self._process(self._last_min_ns, price, volume)
+
+    def _process(self, ts_ns: int, price: float, volume: int) -> Optional[Candle]:
+        bucket = ts_ns - (ts_ns + self._offset_ns) % self.interval_ns
 
-        # If we have a current candle and this tick belongs to a NEW bucket
-        if self.current_candle and bucket_start > self.current_candle.timestamp:
-            # Finalize the previous candle
-            self.current_candle.complete = True
-            self.candles.append(self.current_candle)
-            completed_candle = self.current_candle
-            
-            # Start a new candle
-            self.current_candle = Candle(
-                timestamp=bucket_start,
-                open=price,
-                high=price,
-                low=price,
-                close=price,
-                volume=volume
-            )
-            
-        # If no current candle, start one
-        elif self.current_candle is None:
-            self.current_candle = Candle(
-                timestamp=bucket_start,
-                open=price,
-                high=price,
-                low=price,
-                close=price,
-                volume=volume
-            )
-            
         # Update current candle
-        else:
-            self.current_candle.high = max(self.current_candle.high, price)
-            self.current_candle.low = min(self.current_candle.low, price)
-            self.current_candle.close = price
-            self.current_candle.volume += volume # This assumes volume is cumulative or tick volume. 
-                                                 # If tick volume is cumulative for the day, we need diff.
-                                                 # For now assuming tick volume is "volume traded in this tick" 
-                                                 # or we handle cumulative logic in the feed handler.
+        if self._active and bucket <= self._cur_bucket:
+            if price > self._cur_h:
+                self._cur_h = price
+            elif price < self._cur_l:
+                self._cur_l = price
+            self._cur_c = price
+            self._cur_v += volume # This assumes volume is cumulative or tick volume.
+                                  # If tick volume is cumulative for the day, we need diff.
+                                  # For now assuming tick volume is "volume traded in this tick"
+                                  # or we handle cumulative logic in the feed handler.
+            return None
+
+        # This tick belongs to a NEW bucket: finalize the previous candle
+        completed_candle = None
+        if self._active:
+            completed_candle = self._forming_view(complete=True)
+            self._commit()
 
+        # Start a new candle
+        self._active = True
+        self._cur_bucket = bucket
+        self._cur_o = self._cur_h = self._cur_l = self._cur_c = price
+        self._cur_v = volume
         return completed_candle
 
+    def _commit(self):
+        """Write the forming bar into the next ring slot. The head (_n) moves only
+        after the slot is fully written, so a reader never sees a half-written bar."""
+        i = self._n % self.capacity
+        self._ts[i] = self._cur_bucket
+        self._o[i] = self._cur_o
+        self._h[i] = self._cur_h
+        self._l[i] = self._cur_l
+        self._c[i] = self._cur_c
+        self._v[i] = self._cur_v
+        self._n += 1
+
+    def process_ticks(self, ts_ns: np.ndarray, prices: np.ndarray, volumes: np.ndarray) -> int:
+        """
+        Fold a batch of ticks (epoch-ns, price, volume arrays in time order) in one
+        kernel call. Returns the number of bars completed by the batch.
+        """
+        cur_i = np.array([self._cur_bucket, self._cur_v, self._n, int(self._active)], dtype='i8')
+        cur_f = np.array([self._cur_o, self._cur_h, self._cur_l, self._cur_c], dtype='f8')
+        completed = _resample_nb(
+            np.ascontiguousarray(ts_ns, dtype='i8'),
+            np.ascontiguousarray(prices, dtype='f8'),
+            np.ascontiguousarray(volumes, dtype='i8'),
+            self.interval_ns, self._offset_ns,
+            self._ts, self._o, self._h, self._l, self._c, self._v,
+            cur_i, cur_f
+        )
+        self._cur_bucket, self._cur_v, self._n = int(cur_i[_BUCKET]), int(cur_i[_VOL]), int(cur_i[_COUNT])
+        self._active = bool(cur_i[_ACTIVE])
+        self._cur_o, self._cur_h, self._cur_l, self._cur_c = (float(x) for x in cur_f)
+        return int(completed)
+
+    def _minute_ns(self, timestamp: datetime) -> int:
+        """Epoch-ns of the start of the tick's minute"""
+        if timestamp.tzinfo is None:
+            ts_ns = (timestamp - _EPOCH) // _ONE_US * 1000
+        else:
+            if not self._active:
+                self._tz = timestamp.tzinfo
+                self._offset_ns = timestamp.utcoffset() // _ONE_US * 1000
+            ts_ns = (timestamp - _EPOCH_UTC) // _ONE_US * 1000
+        return ts_ns - (timestamp.second * 1_000_000 + timestamp.microsecond) * 1000
+
+    def _to_datetime(self, ns: int) -> datetime:
+        if self._tz is None:
+            return _EPOCH + timedelta(microseconds=ns // 1000)
+        return datetime.fromtimestamp(ns / 1e9, self._tz)
+
+    def _forming_view(self, complete: bool = False) -> Candle:
+        return Candle(
+            timestamp=self._to_datetime(self._cur_bucket),
+            open=self._cur_o,
+            high=self._cur_h,
+            low=self._cur_l,
+            close=self._cur_c,
+            volume=self._cur_v,
+            complete=complete
+        )
+
     def get_latest_candle(self) -> Optional[Candle]:
-        return self.current_candle
+        if not self._active:
+            return None
+        return self._forming_view()
+
+    def _column(self, arr: np.ndarray) -> np.ndarray:
+        """Completed bars of one column in chronological order (a view until the ring wraps)"""
+        n = self._n
+        if n <= self.capacity:
+            return arr[:n]
+        start = n % self.capacity
+        return np.concatenate((arr[start:], arr[:start]))
+
+    @property
+    def head(self) -> int:
+        """Bars completed so far; readers compare it with the head they last saw"""
+        return self._n
+
+    def latest_n(self, k: int) -> pd.DataFrame:
+        """The last k completed bars (at most `capacity`), oldest first"""
+        k = min(k, self._n, self.capacity)
+        if k <= 0:
+            return pd.DataFrame()
+        idx = np.arange(self._n - k, self._n) % self.capacity
+        return self._frame(lambda arr: arr[idx])
 
     def get_history(self) -> pd.DataFrame:
-        if not self.candles:
+        """All completed bars still in the ring, oldest first"""
+        if not self._n:
             return pd.DataFrame()
-        
-        data = [
+        return self._frame(self._column)
+
+    def _frame(self, col: Callable[[np.ndarray], np.ndarray]) -> pd.DataFrame:
+        # epoch-ns reinterpreted as datetime64[ns] in place (no per-element conversion)
+        index = pd.DatetimeIndex(col(self._ts).view('M8[ns]'), name="timestamp", copy=False)
+        if self._tz is not None:
+            index = index.tz_localize('UTC').tz_convert(self._tz)
+        return pd.DataFrame(
             {
-                "timestamp": c.timestamp,
-                "open": c.open,
-                "high": c.high,
-                "low": c.low,
-                "close": c.close,
-                "volume": c.volume
-            }
-            for c in self.candles
-        ]
-        return pd.DataFrame(data).set_index("timestamp")
+                "open": col(self._o),
+                "high": col(self._h),
+                "low": col(self._l),
+                "close": col(self._c),
+                "volume": col(self._v)
+            },
+            index=index,
+            copy=False
+        )
+
+class MultiResampler:
+    """
+    Several CandleResamplers fed by one tick stream (e.g. 3m and 5m bars).
+
+    Ticks are epoch-ns ints. One compare against the earliest bucket end of the
+    forming bars decides whether any interval can roll over; while none can
+    (almost every tick), the forming bars are extended directly and the
+    per-interval bucket arithmetic is skipped.
+    """
+    __slots__ = ('resamplers', '_next_close', '_no_bars')
+
+    def __init__(self, intervals: Tuple[int, ...], capacity: int = 4096, tz: Optional[tzinfo] = None):
+        self.resamplers = tuple(CandleResampler(m, capacity=capacity, tz=tz) for m in intervals)
+        self._next_close = 0  # epoch-ns where the first forming bar ends
+        self._no_bars = (None,) * len(self.resamplers)
+
+    def __getitem__(self, i: int) -> CandleResampler:
+        return self.resamplers[i]
+
+    def process_tick(self, price: float, volume: int, ts_ns: int) -> Tuple[Optional[Candle], ...]:
+        """Feed one tick to every interval; returns the bar each one completed (or None)"""
+        if ts_ns < self._next_close:
+            for r in self.resamplers:
+                if price > r._cur_h:
+                    r._cur_h = price
+                elif price < r._cur_l:
+                    r._cur_l = price
+                r._cur_c = price
+                r._cur_v += volume
+            return self._no_bars
+
+        done = tuple(r._process(ts_ns, price, volume) for r in self.resamplers)
+        self._next_close = min(r._cur_bucket + r.interval_ns for r in self.resamplers)
+        return done
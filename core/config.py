@@ -1,37 +1,116 @@
 import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv(override=True)
-
-# Shoonya Credentials
-SHOONYA_USER = os.getenv("SHOONYA_USER")
-SHOONYA_PWD = os.getenv("SHOONYA_PWD")
-SHOONYA_API_KEY = os.getenv("SHOONYA_API_KEY")
-SHOONYA_TOTP = os.getenv("SHOONYA_TOTP")
-SHOONYA_VENDOR = os.getenv("SHOONYA_VENDOR")
-SHOONYA_IMEI = os.getenv("SHOONYA_IMEI", "abc1234")
-
-# Telegram Credentials
-TELEGRAM_BOT_TOKEN = os.getenv("MAA_TELEGRAM_BOT_TOKEN") or os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("MAA_TELEGRAM_CHAT_ID") or os.getenv("TELEGRAM_CHAT_ID")
-TELEGRAM_MODE = os.getenv("TELEGRAM_MODE", "ON").upper() == "ON"
-
-# Trading Config
-TRADING_SYMBOL_CE = os.getenv("TRADING_SYMBOL_CE")
-TRADING_SYMBOL_PE = os.getenv("TRADING_SYMBOL_PE")
-QUANTITY = 1 # Number of Lots
-USE_VOLUME_WEIGHTING = False 
-MIN_SIGNAL_STRENGTH = 2.5 # Minimum score for high-conviction signal
-MIN_SIGNAL_CONFIRMATION = 5 # Number of ticks for signal validation
-MIN_SIGNAL_HOLD_TIME = 60 # Seconds between signals
-
-# Paper Trading
-PAPER_TRADING_MODE = os.getenv("PAPER_TRADING_MODE", "true").lower() == "true"  # Default: paper trading ON
-
-# Signal Quality Filters (for high conviction trades)
-MIN_SIGNAL_STRENGTH = float(os.getenv("MIN_SIGNAL_STRENGTH", "5.5"))  # Minimum strength to generate signal (higher = fewer, better signals)
-MIN_SIGNAL_HOLD_TIME = int(os.getenv("MIN_SIGNAL_HOLD_TIME", "60"))  # Seconds to hold before allowing new signal (prevents churn)
-# Trailing Stop Loss
-TSL_PROFIT_HURDLE = float(os.getenv("TSL_PROFIT_HURDLE", "5.0"))  # Activate TSL at 5% profit
-TSL_TRAIL_PERCENT = float(os.getenv("TSL_TRAIL_PERCENT", "5.0"))  # Trail by 5%
+@dataclass(frozen=True)
+class Config:
+    # Shoonya Credentials
+    SHOONYA_USER: Optional[str]
+    SHOONYA_PWD: Optional[str]
+    SHOONYA_API_KEY: Optional[str]
+    SHOONYA_TOTP: Optional[str]
+    SHOONYA_VENDOR: Optional[str]
+    SHOONYA_IMEI: str
+
+    # Telegram Credentials
+    TELEGRAM_BOT_TOKEN: Optional[str]
+    TELEGRAM_CHAT_ID: Optional[str]
+    TELEGRAM_MODE: bool
+
+    # Trading Config
+    TRADING_SYMBOL_CE: Optional[str]
+    TRADING_SYMBOL_PE: Optional[str]
+    QUANTITY: int                   # Number of Lots
+    USE_VOLUME_WEIGHTING: bool
+
+    # Signal Quality Filters (for high conviction trades)
+    MIN_SIGNAL_STRENGTH: float      # Minimum strength to generate signal (higher = fewer, better signals)
+    MIN_SIGNAL_CONFIRMATION: int    # Number of ticks for signal validation
+    MIN_SIGNAL_HOLD_TIME: int       # Seconds to hold before allowing new signal (prevents churn)
+
+    # Trailing Stop Loss
+    TSL_PROFIT_HURDLE: float        # Activate TSL at this % profit
+    TSL_TRAIL_PERCENT: float        # Trail by this %
+
+    # Web API scaling: with API_WORKERS > 1 and a REDIS_URL, ticks are fanned out
+    # to the uvicorn workers over Redis pub/sub
+    REDIS_URL: str
+    REDIS_TICKS_CHANNEL: str
+    API_WORKERS: int
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Read .env and the environment once; every later call returns the same Config.
+    
+    Config holds startup settings only. PAPER_TRADING_MODE changes at runtime,
+    so it is not part of it: read it as the module attribute `config.PAPER_TRADING_MODE`.
+    """
+    # Load environment variables from .env file
+    load_dotenv(override=True)
+    env = os.getenv
+    return Config(
+        SHOONYA_USER=env("SHOONYA_USER"),
+        SHOONYA_PWD=env("SHOONYA_PWD"),
+        SHOONYA_API_KEY=env("SHOONYA_API_KEY"),
+        SHOONYA_TOTP=env("SHOONYA_TOTP"),
+        SHOONYA_VENDOR=env("SHOONYA_VENDOR"),
+        SHOONYA_IMEI=env("SHOONYA_IMEI", "abc1234"),
+
+        TELEGRAM_BOT_TOKEN=env("MAA_TELEGRAM_BOT_TOKEN") or env("TELEGRAM_BOT_TOKEN"),
+        TELEGRAM_CHAT_ID=env("MAA_TELEGRAM_CHAT_ID") or env("TELEGRAM_CHAT_ID"),
+        TELEGRAM_MODE=env("TELEGRAM_MODE", "ON").upper() == "ON",
+
+        TRADING_SYMBOL_CE=env("TRADING_SYMBOL_CE"),
+        TRADING_SYMBOL_PE=env("TRADING_SYMBOL_PE"),
+        QUANTITY=1,
+        USE_VOLUME_WEIGHTING=False,
+
+
+        MIN_SIGNAL_STRENGTH=float(env("MIN_SIGNAL_STRENGTH", "5.5")),
+        MIN_SIGNAL_CONFIRMATION=5,
+        MIN_SIGNAL_HOLD_TIME=int(env("MIN_SIGNAL_HOLD_TIME", "60")),
+
+        TSL_PROFIT_HURDLE=float(env("TSL_PROFIT_HURDLE", "5.0")),
+        TSL_TRAIL_PERCENT=float(env("TSL_TRAIL_PERCENT", "5.0")),
+
+        REDIS_URL=env("REDIS_URL", ""),
+        REDIS_TICKS_CHANNEL=env("REDIS_TICKS_CHANNEL", "ticks"),
+        API_WORKERS=int(env("API_WORKERS", "1")),
+    )
+
+# Built eagerly at import. Module-level names are kept for existing `config.X` readers.
+_c = get_config()
+
+SHOONYA_USER = _c.SHOONYA_USER
+SHOONYA_PWD = _c.SHOONYA_PWD
+SHOONYA_API_KEY = _c.SHOONYA_API_KEY
+SHOONYA_TOTP = _c.SHOONYA_TOTP
+SHOONYA_VENDOR = _c.SHOONYA_VENDOR
+SHOONYA_IMEI = _c.SHOONYA_IMEI
+
+TELEGRAM_BOT_TOKEN = _c.TELEGRAM_BOT_TOKEN
+TELEGRAM_CHAT_ID = _c.TELEGRAM_CHAT_ID
+TELEGRAM_MODE = _c.TELEGRAM_MODE
+
+TRADING_SYMBOL_CE = _c.TRADING_SYMBOL_CE
+TRADING_SYMBOL_PE = _c.TRADING_SYMBOL_PE
+QUANTITY = _c.QUANTITY
+USE_VOLUME_WEIGHTING = _c.USE_VOLUME_WEIGHTING
+
+# Paper Trading. Runtime state rather than configuration: the UI toggle and the
+# saved mode switch it by assigning here. Default: paper trading ON (.env is
+# already loaded by get_config)
+PAPER_TRADING_MODE = os.getenv("PAPER_TRADING_MODE", "true").lower() == "true"
+
+MIN_SIGNAL_STRENGTH = _c.MIN_SIGNAL_STRENGTH
+MIN_SIGNAL_CONFIRMATION = _c.MIN_SIGNAL_CONFIRMATION
+MIN_SIGNAL_HOLD_TIME = _c.MIN_SIGNAL_HOLD_TIME
+
+TSL_PROFIT_HURDLE = _c.TSL_PROFIT_HURDLE
+TSL_TRAIL_PERCENT = _c.TSL_TRAIL_PERCENT
+
+REDIS_URL = _c.REDIS_URL
+REDIS_TICKS_CHANNEL = _c.REDIS_TICKS_CHANNEL
+API_WORKERS = _c.API_WORKERS
@@ -1,43 +1,254 @@
 import sqlite3
 import json
+import atexit
 import logging
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+from core.market_data import iso_now
 
 logger = logging.getLogger(__name__)
 
+# Schema version stored in PRAGMA user_version
+#   1: orders keep typed columns only (no raw_data JSON), timestamp as INTEGER epoch-ns
+#   2: orders is STRICT, WITHOUT ROWID (clustered on id); 8KB pages
+SCHEMA_VERSION = 2
+PAGE_SIZE = 8192
+
+# Page cache (negative = KiB) and memory-mapped read window. The mmap window is
+# kept well under what a 32-bit Pi can map; the database itself is a few MB.
+CACHE_SIZE_KB = 65536
+MMAP_SIZE = 256 * 1024 * 1024
+
+# STRICT tables need SQLite 3.37+; older libraries get the same typed layout without it
+_STRICT = ", STRICT" if sqlite3.sqlite_version_info >= (3, 37, 0) else ""
+
+ORDERS_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS orders (
+        id TEXT PRIMARY KEY,
+        symbol TEXT,
+        side TEXT,
+        qty INTEGER,
+        price REAL,
+        status TEXT,
+        reason TEXT,
+        timestamp INTEGER NOT NULL
+    ) WITHOUT ROWID{_STRICT}
+"""
+
+# Runtime statements, kept as constants so every call hands sqlite3's
+# per-connection statement cache the same text
+SAVE_ORDER_SQL = """
+    INSERT OR REPLACE INTO orders (id, symbol, side, qty, price, status, reason, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SAVE_POSITION_SQL = """
+    INSERT OR REPLACE INTO positions (symbol, product, net_qty, avg_price, realized_pnl, last_updated)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+RECENT_ORDERS_SQL = (
+    "SELECT id, symbol, side, qty, price, status, reason, timestamp FROM orders "
+    "ORDER BY timestamp DESC LIMIT ?"
+)
+ORDERS_IN_RANGE_SQL = (
+    "SELECT id, symbol, side, qty, price, status, reason, timestamp FROM orders "
+    "WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp DESC"
+)
+DELETE_ORDERS_IN_RANGE_SQL = "DELETE FROM orders WHERE timestamp >= ? AND timestamp < ?"
+SELECT_POSITIONS_SQL = "SELECT symbol, product, net_qty, avg_price, realized_pnl FROM positions"
+SAVE_STATE_SQL = "INSERT OR REPLACE INTO app_state (key, value) VALUES (?, ?)"
+GET_STATE_SQL = "SELECT value FROM app_state WHERE key = ?"
+
+# Order/position upserts are buffered and written in one transaction once this
+# many rows are pending, or FLUSH_INTERVAL seconds after the first one
+FLUSH_MAX_ROWS = 64
+FLUSH_INTERVAL = 0.25
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_US = timedelta(microseconds=1)
+
+def _to_ns(ts) -> int:
+    """Order timestamp (ISO string or datetime) -> wall-clock epoch-ns. Any UTC
+    offset is dropped so a row stays on the calendar day written in the string."""
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    return (ts.replace(tzinfo=None) - _EPOCH) // _ONE_US * 1000
+
+def _legacy_reason(raw) -> Optional[str]:
+    """'reason' from a v0 raw_data JSON column; None when the column is NULL,
+    not JSON, or not an object"""
+    try:
+        data = json.loads(raw) if raw else None
+    except (TypeError, ValueError):
+        return None
+    return data.get('reason') if isinstance(data, dict) else None
+
+def _from_ns(ns: int) -> str:
+    return (_EPOCH + timedelta(microseconds=ns // 1000)).isoformat()
+
+def _order_from_row(row) -> Dict[str, Any]:
+    oid, symbol, side, qty, price, status, reason, ts_ns = row
+    return {
+        'id': oid, 'symbol': symbol, 'side': side, 'qty': qty, 'price': price,
+        'status': status, 'reason': reason, 'timestamp': _from_ns(ts_ns)
+    }
+
+def _day_range(date_str: str) -> Tuple[int, int]:
+    """[date, next date) bounds in epoch-ns, range-scanned via idx_orders_ts"""
+    day = datetime.fromisoformat(date_str)
+    return _to_ns(day), _to_ns(day + timedelta(days=1))
+
 class TradingDatabase:
     def __init__(self, db_path: str = "data/trading_state.db"):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # One long-lived autocommit connection shared by the feed thread and the
+        # API threadpool; every use is serialized by the lock
+        self._lock = threading.Lock()
+        self._conn = self._connect()
         self._init_db()
 
-    def _get_connection(self):
-        return sqlite3.connect(self.db_path)
+        # Pending writes (guarded by the lock); positions keep only the latest
+        # state per (symbol, product)
+        self._order_buf: list = []
+        self._pos_buf: dict = {}
+        # A single flusher thread writes the buffers FLUSH_INTERVAL after it is woken
+        self._flush_wakeup = threading.Event()
+        self._closed = False
+        threading.Thread(target=self._flusher, name="DBFlusher", daemon=True).start()
+        # Flush and checkpoint on exit (the flusher thread keeps this object alive)
+        atexit.register(self.close)
+
+        # Write-through read caches (guarded by the lock). They are dropped when
+        # PRAGMA data_version shows a commit from another connection (e.g. the
+        # bot process while API workers read the same file).
+        self._state_cache: Dict[str, Optional[str]] = {}
+        self._positions_cache: Optional[Dict[Tuple[str, str], Dict[str, Any]]] = None
+        self._data_version = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        # Only takes effect while the file is still empty (existing files are
+        # rebuilt once by the v2 migration)
+        conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        return conn
+
+    def reload_from_db(self):
+        """Forget cached state/positions so the next reads hit SQLite"""
+        with self._lock:
+            self._state_cache.clear()
+            self._positions_cache = None
+
+    def _check_external_writes_locked(self):
+        """Drop the read caches if another connection has committed since they were filled"""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self._state_cache.clear()
+            self._positions_cache = None
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            if self._order_buf or self._pos_buf:
+                logger.error(f"Database closed with unsaved rows: orders={self._order_buf} "
+                             f"positions={list(self._pos_buf.values())}")
+            self._closed = True
+            self._conn.close()
+        self._flush_wakeup.set()
+
+    def flush(self):
+        """Write any buffered orders/positions"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flusher(self):
+        """Flusher thread: writes the buffers FLUSH_INTERVAL after the first pending row"""
+        while True:
+            self._flush_wakeup.wait()
+            if self._closed:
+                return
+            time.sleep(FLUSH_INTERVAL)
+            self._flush_wakeup.clear()
+            with self._lock:
+                if self._closed:
+                    return
+                self._flush_locked()
+                if self._order_buf or self._pos_buf:
+                    self._flush_wakeup.set() # failed: retry after another interval
+
+    def _queue_write_locked(self):
+        if len(self._order_buf) + len(self._pos_buf) >= FLUSH_MAX_ROWS:
+            self._flush_locked()
+        if self._order_buf or self._pos_buf:
+            self._flush_wakeup.set()
+
+    def _flush_locked(self):
+        if not self._order_buf and not self._pos_buf:
+            return
+
+        orders = self._order_buf
+        positions = list(self._pos_buf.values())
+        try:
+            self._conn.execute("BEGIN")
+            try:
+                if orders:
+                    self._conn.executemany(SAVE_ORDER_SQL, orders)
+                if positions:
+                    self._conn.executemany(SAVE_POSITION_SQL, positions)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        except sqlite3.OperationalError as e:
+            # Locked/busy/disk trouble: the rows stay buffered (we hold the lock,
+            # so nothing newer was queued) and the next flush retries them
+            logger.error(f"Error flushing {len(orders)} orders / {len(positions)} positions to DB, will retry: {e}")
+            return
+        except Exception as e:
+            # A bad row fails the whole batch: write row by row so only it is lost
+            logger.error(f"Error flushing {len(orders)} orders / {len(positions)} positions to DB: {e}")
+            for sql, rows in ((SAVE_ORDER_SQL, orders), (SAVE_POSITION_SQL, positions)):
+                for row in rows:
+                    try:
+                        self._conn.execute(sql, row)
+                    except Exception as row_error:
+                        logger.error(f"Dropping row that cannot be saved: {row} ({row_error})")
+        self._order_buf = []
+        self._pos_buf.clear()
 
     def _init_db(self):
-        """Initialize database tables"""
-        with self._get_connection() as conn:
+        """Initialize database tables. An existing orders table is left in its
+        schema; upgrading it is up to migrate()."""
+        with self._lock:
+            conn = self._conn
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            fresh = conn.execute("PRAGMA table_info(orders)").fetchone() is None
+
             # Orders Table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS orders (
-                    id TEXT PRIMARY KEY,
-                    symbol TEXT,
-                    side TEXT,
-                    qty INTEGER,
-                    price REAL,
-                    status TEXT,
-                    timestamp TEXT,
-                    raw_data TEXT
-                )
-            """)
-            
+            conn.execute(ORDERS_TABLE_SQL)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_ts ON orders(timestamp DESC)")
+            if fresh:
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            elif version < SCHEMA_VERSION:
+                logger.warning(f"Database: orders table is at schema v{version}, "
+                               f"migrate() upgrades it to v{SCHEMA_VERSION}")
+
             # Positions Table (Keyed by Symbol + Product Type)
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS positions (
                     symbol TEXT,
-                    product TEXT,
+                    product TEXT NOT NULL DEFAULT 'I',
                     net_qty INTEGER,
                     avg_price REAL,
                     realized_pnl REAL,
@@ -45,13 +256,15 @@ class TradingDatabase:
                     PRIMARY KEY (symbol, product)
                 )
             """)
-            
+
             # Migration: Ensure 'product' column exists (if someone had an old DB)
             try:
                 conn.execute("ALTER TABLE positions ADD COLUMN product TEXT DEFAULT 'I'")
             except:
                 pass # Already exists
-            
+            # Rows from before 'product' existed count as intraday
+            conn.execute("UPDATE positions SET product = 'I' WHERE product IS NULL OR product = ''")
+
             # App State (e.g. Total Realized P&L)
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS app_state (
@@ -59,36 +272,94 @@ class TradingDatabase:
                     value TEXT
                 )
             """)
-            conn.commit()
 
-    def save_order(self, order: Dict[str, Any]):
-        """Save or update an order"""
+    def migrate(self):
+        """Upgrade an older database to SCHEMA_VERSION; this may rebuild the file.
+        
+        Called once at startup (launch_web / main), before any other process
+        opens the database.
+        """
+        with self._lock:
+            conn = self._conn
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            self._migrate_orders(conn, version)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_ts ON orders(timestamp DESC)")
+
+    def _migrate_orders(self, conn: sqlite3.Connection, version: int):
+        """Rebuild the orders table in the current schema"""
+        columns = [r[1] for r in conn.execute("PRAGMA table_info(orders)")]
+        conn.execute("BEGIN")
         try:
-            with self._get_connection() as conn:
+            if 'raw_data' in columns:
+                # v0: TEXT timestamp + raw_data JSON
+                rows = []
+                for oid, symbol, side, qty, price, status, ts, raw in conn.execute(
+                    "SELECT id, symbol, side, qty, price, status, timestamp, raw_data FROM orders"
+                ):
+                    try:
+                        ts_ns = _to_ns(ts) if ts is not None else time.time_ns()
+                    except (TypeError, ValueError, AttributeError):
+                        ts_ns = time.time_ns()
+                    rows.append((oid, symbol, side, qty, price, status, _legacy_reason(raw), ts_ns))
+
+                conn.execute("DROP TABLE orders")
+                conn.execute(ORDERS_TABLE_SQL)
+                conn.executemany(SAVE_ORDER_SQL, rows)
+                logger.info(f"Database: migrated {len(rows)} orders to schema v{SCHEMA_VERSION}")
+            elif columns:
+                # v1: same columns, rowid table
+                conn.execute("ALTER TABLE orders RENAME TO orders_v1")
+                conn.execute("DROP INDEX IF EXISTS idx_orders_ts")
+                conn.execute(ORDERS_TABLE_SQL)
                 conn.execute("""
-                    INSERT OR REPLACE INTO orders (id, symbol, side, qty, price, status, timestamp, raw_data)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    order.get('id'),
-                    order.get('symbol'),
-                    order.get('side'),
-                    order.get('qty'),
-                    order.get('price'),
-                    order.get('status'),
-                    order.get('timestamp', datetime.now().isoformat()),
-                    json.dumps(order)
-                ))
-                conn.commit()
+                    INSERT INTO orders (id, symbol, side, qty, price, status, reason, timestamp)
+                    SELECT id, symbol, side, qty, price, status, reason, COALESCE(timestamp, 0) FROM orders_v1
+                """)
+                conn.execute("DROP TABLE orders_v1")
+                logger.info(f"Database: migrated orders to schema v{SCHEMA_VERSION}")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if conn.execute("PRAGMA page_size").fetchone()[0] != PAGE_SIZE:
+            # The page size of a WAL database can only change by rebuilding it
+            # outside WAL mode
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA journal_mode=WAL")
+
+    def save_order(self, order: Dict[str, Any]):
+        """Save or update an order (buffered, see flush)"""
+        try:
+            row = (
+                order.get('id'),
+                order.get('symbol'),
+                order.get('side'),
+                order.get('qty'),
+                order.get('price'),
+                order.get('status'),
+                order.get('reason'),
+                _to_ns(order.get('timestamp') or datetime.now())
+            )
+            with self._lock:
+                self._order_buf.append(row)
+                self._queue_write_locked()
         except Exception as e:
             logger.error(f"Error saving order to DB: {e}")
 
     def get_recent_orders(self, limit: int = 50) -> List[Dict[str, Any]]:
         """Fetch recent orders from DB"""
         try:
-            with self._get_connection() as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.execute("SELECT raw_data FROM orders ORDER BY timestamp DESC LIMIT ?", (limit,))
-                return [json.loads(row['raw_data']) for row in cursor.fetchall()]
+            with self._lock:
+                self._flush_locked()
+                cursor = self._conn.execute(RECENT_ORDERS_SQL, (limit,))
+                cursor.arraysize = limit
+                return list(map(_order_from_row, cursor.fetchmany()))
         except Exception as e:
             logger.error(f"Error fetching orders from DB: {e}")
             return []
@@ -96,11 +367,11 @@ class TradingDatabase:
     def get_orders_by_date(self, date_str: str) -> List[Dict[str, Any]]:
         """Fetch orders for a specific date (YYYY-MM-DD)"""
         try:
-            with self._get_connection() as conn:
-                conn.row_factory = sqlite3.Row
-                # Use LIKE or substr to match the date part of ISO timestamp
-                cursor = conn.execute("SELECT raw_data FROM orders WHERE timestamp LIKE ? ORDER BY timestamp DESC", (f"{date_str}%",))
-                return [json.loads(row['raw_data']) for row in cursor.fetchall()]
+            with self._lock:
+                self._flush_locked()
+                # Stream rows off the cursor instead of materialising fetchall() first
+                cursor = self._conn.execute(ORDERS_IN_RANGE_SQL, _day_range(date_str))
+                return list(map(_order_from_row, cursor))
         except Exception as e:
             logger.error(f"Error filtering orders by date: {e}")
             return []
@@ -108,44 +379,52 @@ class TradingDatabase:
     def clear_orders_for_date(self, date_str: str):
         """Clear all orders for a specific date"""
         try:
-            with self._get_connection() as conn:
-                conn.execute("DELETE FROM orders WHERE timestamp LIKE ?", (f"{date_str}%",))
-                conn.commit()
-                logger.info(f"🗑️ Database: Cleared orders for date {date_str}")
+            with self._lock:
+                self._flush_locked()
+                self._conn.execute(DELETE_ORDERS_IN_RANGE_SQL, _day_range(date_str))
+            logger.info(f"🗑️ Database: Cleared orders for date {date_str}")
         except Exception as e:
             logger.error(f"Error clearing orders for date {date_str}: {e}")
 
     def save_position(self, symbol: str, pos_data: Dict[str, Any], product: str = 'I'):
-        """Save position state for a symbol + product"""
+        """Save position state for a symbol + product (buffered, see flush)"""
         try:
-            with self._get_connection() as conn:
-                conn.execute("""
-                    INSERT OR REPLACE INTO positions (symbol, product, net_qty, avg_price, realized_pnl, last_updated)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    symbol,
-                    product,
-                    pos_data.get('net_qty', 0),
-                    pos_data.get('avg_price', 0.0),
-                    pos_data.get('realized_pnl', 0.0),
-                    datetime.now().isoformat()
-                ))
-                conn.commit()
+            row = (
+                symbol,
+                product,
+                pos_data.get('net_qty', 0),
+                pos_data.get('avg_price', 0.0),
+                pos_data.get('realized_pnl', 0.0),
+                iso_now()
+            )
+            with self._lock:
+                self._pos_buf[(symbol, product)] = row
+                if self._positions_cache is not None:
+                    self._positions_cache[(symbol, product)] = {
+                        'net_qty': row[2],
+                        'avg_price': row[3],
+                        'realized_pnl': row[4],
+                        'unrealized_pnl': 0.0
+                    }
+                self._queue_write_locked()
         except Exception as e:
             logger.error(f"Error saving position to DB: {e}")
 
     def get_positions(self) -> Dict[str, Any]:
         """Load all saved positions as {(symbol, product): data}"""
         try:
-            with self._get_connection() as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.execute("SELECT * FROM positions")
-                return {(row['symbol'], row['product'] or 'I'): {
-                    'net_qty': row['net_qty'],
-                    'avg_price': row['avg_price'],
-                    'realized_pnl': row['realized_pnl'],
-                    'unrealized_pnl': 0.0 # Calculated at runtime
-                } for row in cursor.fetchall()}
+            with self._lock:
+                self._check_external_writes_locked()
+                if self._positions_cache is None:
+                    self._flush_locked()
+                    self._positions_cache = {(symbol, product): {
+                        'net_qty': net_qty,
+                        'avg_price': avg_price,
+                        'realized_pnl': realized_pnl,
+                        'unrealized_pnl': 0.0 # Calculated at runtime
+                    } for symbol, product, net_qty, avg_price, realized_pnl in self._conn.execute(SELECT_POSITIONS_SQL)}
+                # Callers own (and mutate) what they get back
+                return {key: dict(pos) for key, pos in self._positions_cache.items()}
         except Exception as e:
             logger.error(f"Error loading positions from DB: {e}")
             return {}
@@ -153,21 +432,39 @@ class TradingDatabase:
     def save_state(self, key: str, value: Any):
         """Save simple key-value state"""
         try:
-            with self._get_connection() as conn:
-                conn.execute("INSERT OR REPLACE INTO app_state (key, value) VALUES (?, ?)", (key, str(value)))
-                conn.commit()
+            with self._lock:
+                self._conn.execute(SAVE_STATE_SQL, (key, str(value)))
+                self._state_cache[key] = str(value)
         except Exception as e:
             logger.error(f"Error saving state to DB: {e}")
 
     def get_state(self, key: str, default: Any = None) -> Any:
         try:
-            with self._get_connection() as conn:
-                cursor = conn.execute("SELECT value FROM app_state WHERE key = ?", (key,))
-                row = cursor.fetchone()
-                return row[0] if row else default
+            with self._lock:
+                self._check_external_writes_locked()
+                if key not in self._state_cache:
+                    row = self._conn.execute(GET_STATE_SQL, (key,)).fetchone()
+                    self._state_cache[key] = row[0] if row else None
+                value = self._state_cache[key]
+            return value if value is not None else default
         except Exception as e:
             logger.error(f"Error getting state from DB: {e}")
             return default
 
-# Global instance
-db = TradingDatabase()
+# Shared instance, opened on first use (importing this module touches no file)
+DB_PATH = "data/trading_state.db"
+_db: Optional[TradingDatabase] = None
+_db_lock = threading.Lock()
+
+def get_db() -> TradingDatabase:
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = TradingDatabase(DB_PATH)
+        return _db
+
+def __getattr__(name: str):
+    # `from core.database import db` keeps working, resolved lazily
+    if name == "db":
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,21 +1,31 @@
+import calendar
+from bisect import bisect_left
 import logging
+import math
 import time
 from datetime import datetime, timedelta
-from typing import Dict
+from functools import lru_cache, partial
+from typing import Dict, List, Optional, Tuple
 import re
+import queue
 import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo
 import asyncio
-import pytz
+import numpy as np
 import pandas as pd
 
 from core.shoonya_client import ShoonyaSession
-from core.candles import CandleResampler
-from core.strategy import Strategy, WeightageCalculator, TechnicalIndicators
+from core.candles import MultiResampler
+from core.vwap import VwapBook
+from core.strategy import Signal, Strategy, WeightageCalculator, TechnicalIndicators
 from core.telegram_bot import TelegramBot
 from core import config
 from core.order_logger import log_signal, log_order_attempt, log_order_result, log_order_update
 from core.paper_trading import PaperTradingEngine
-from core.market_data import market_data
+from core.market_data import market_data, iso_now
+from core.queues import RingQueue
 
 # OMS Imports
 from core.oms.position_manager import PositionManager
@@ -24,15 +34,135 @@ from core.oms.order_manager import OrderManager
 logger = logging.getLogger(__name__)
 
 # Timezone Definition
-IST = pytz.timezone('Asia/Kolkata')
+IST = ZoneInfo('Asia/Kolkata')
+
+# Raw ticks buffered between the broker callback and the consumer thread
+TICK_QUEUE_SIZE = 10000
+
+# Broker history calls in flight at once during the hourly macro refresh
+MACRO_FETCH_CONCURRENCY = 5
+
+# Telegram alerts waiting for the sender thread
+TELEGRAM_QUEUE_SIZE = 1024
+# Alerts arriving this close together are joined into one message (seconds),
+# up to this many characters (Telegram's hard limit is 4096)
+TELEGRAM_BATCH_WINDOW = 0.2
+TELEGRAM_BATCH_CHARS = 4000
+
+# Signal types that open a position; anything else (EXIT) closes it
+_ENTRY_TYPES = frozenset(("BUY_CE", "BUY_PE"))
+
+# P&L marker by sign: loss, flat/unknown, profit
+_PNL_EMOJI = ("❌", "⚪", "💚")
+
+def _format_pnl(pnl: Optional[float]) -> Tuple[str, str]:
+    """(display text, emoji) for an alert; a missing or zero P&L shows as N/A"""
+    if not pnl:
+        return "N/A", _PNL_EMOJI[1]
+    return f"₹{pnl:.2f}", _PNL_EMOJI[1 + (pnl > 0) - (pnl < 0)]
+
+# Order alert templates, filled with str.format_map
+_TMPL_PAPER_ENTRY = (
+    "📝 PAPER ENTRY\n"
+    "Symbol: {symbol}\n"
+    "Action: {action} {qty} lots\n"
+    "Type: {type}\n"
+    "Price: ₹{price:.2f}\n"
+    "Strike: {strike}\n"
+    "Strength: {strength:.2f}"
+)
+_TMPL_PAPER_EXIT = (
+    "📝 {emoji} PAPER EXIT\n"
+    "Symbol: {symbol}\n"
+    "Action: SELL {qty} lots\n"
+    "Exit Price: ₹{price:.2f}\n"
+    "Entry Price: ₹{entry_price:.2f}\n"
+    "P&L: {pnl}"
+)
+_TMPL_ENTRY = (
+    "✅ **ENTRY ORDER PLACED**\n"
+    "Symbol: `{symbol}`\n"
+    "Action: **{action}** {qty} lots\n"
+    "Type: {type}\n"
+    "Entry Price (est): ₹{price:.2f}\n"
+    "Strike: {strike}\n"
+    "Order ID: {order_id}"
+)
+_TMPL_EXIT = (
+    "{emoji} **EXIT ORDER PLACED**\n"
+    "Symbol: `{symbol}`\n"
+    "Action: **SELL** {qty} lots\n"
+    "Exit Price (est): ₹{price:.2f}\n"
+    "Entry Price (est): ₹{entry_price:.2f}\n"
+    "**P&L: {pnl}**\n"
+    "Order ID: {order_id}"
+)
+# Signal details shared by the failure alerts
+_TMPL_SIGNAL_CONTEXT = (
+    "Symbol: `{symbol}`\n"
+    "Type: {type}\n"
+    "Action: **{action}** {qty} lots\n"
+    "Price (signal): ₹{price:.2f}\n"
+    "Strike: {strike}\n"
+    "Strength: {strength:.2f}\n"
+    "Reason: {reason}\n"
+)
+_TMPL_FAILED = (
+    "❌ **ORDER FAILED**\n"
+    + _TMPL_SIGNAL_CONTEXT +
+    "\n⚠️ **Failure**: API returned None\n"
+    "Possible causes:\n"
+    "- NFO segment not enabled\n"
+    "- Invalid symbol\n"
+    "- Exchange closed\n"
+    "- Network issue"
+)
+_TMPL_EXCEPTION = (
+    "❌ **ORDER EXCEPTION**\n"
+    + _TMPL_SIGNAL_CONTEXT +
+    "\n⚠️ **Error**: {error}\n"
+)
+
+# A broker tick after one round of parsing/typing
+Tick = namedtuple('Tick', 'idx symbol price volume open high low change prev_close ts_ns')
+
+# Outcome of a live order placed by execute_signal or exit_positions; kind is PLACED, FAILED or EXCEPTION
+# pos_key is the (symbol, product) position a trailing-stop exit closes, else None
+OrderEvent = namedtuple('OrderEvent', 'kind order_id symbol qty action strike price signal_type strength reason error ts pos_key')
+
+# Dashboard payload fields published per symbol
+_PAYLOAD_KEYS = ('symbol', 'ltp', 'volume', 'open', 'high', 'low', 'change', 'percent_change',
+                 'vwap', 'trend', 'macro', 'ai_signal', 'timestamp')
+
+# Entry strike distance from ATM by signal strength: offset i applies when
+# strength is above i thresholds
+#   <= 6.5   ATM              Delta ~0.50, probability ~50%
+#   <= 8.0   1 strike OTM     Delta ~0.45-0.48, probability ~47%
+#   >  8.0   2 strikes OTM    Delta ~0.40-0.45, probability ~45% (more leverage)
+_STRENGTH_THRESHOLDS = (6.5, 8.0)
+_STRIKE_OFFSETS = (0, 100, 200)
+
+# Strike at the end of an option symbol, e.g. "BANKNIFTY30DEC25C59600" -> 59600
+_STRIKE_RE = re.compile(r'([CP])(\d+)$')
+
+@lru_cache(maxsize=32)
+def _last_wednesday(year: int, month: int) -> datetime:
+    """Monthly expiry: the last Wednesday of the month"""
+    last_day = calendar.monthrange(year, month)[1]
+    return next(datetime(year, month, d) for d in range(last_day, 0, -1) if datetime(year, month, d).weekday() == 2)
 
 class TickEngine:
     def __init__(self):
         self.shoonya = ShoonyaSession()
         self.telegram = TelegramBot()
+        # Alerts are sent from a worker thread so a Telegram round-trip never
+        # holds up tick processing or order placement
+        self._tg_queue = RingQueue(TELEGRAM_QUEUE_SIZE, name="Telegram queue")
+        threading.Thread(target=self._tg_drain, name="TelegramSender", daemon=True).start()
         
-        self.resampler_3m = CandleResampler(interval_minutes=3)
-        self.resampler_5m = CandleResampler(interval_minutes=5)
+        # Ticks are bucketed from epoch-ns, aligned to IST wall-clock bars
+        self.resampler = MultiResampler((3, 5), tz=IST)
+        self.resampler_3m, self.resampler_5m = self.resampler.resamplers
         
         self.weightage_calc = WeightageCalculator(use_volume=config.USE_VOLUME_WEIGHTING)
         self.strategy = Strategy(
@@ -48,14 +178,43 @@ class TickEngine:
         self.auto_trading_enabled = False # Toggle via API
         
         self.paper_trading = PaperTradingEngine()
+        self._md = market_data # bound once for the tick path
+        self._payloads: Dict[str, dict] = {} # Symbol -> dashboard payload, updated in place
         
         self.token_map: Dict[str, str] = {} # Symbol -> Token
         self.reverse_token_map: Dict[str, str] = {} # Token -> Symbol
+        self.symbols: List[Tuple[str, str, str]] = [] # (symbol, token, exchange), in resolution order
+        self._sub_strings: List[str] = [] # "EXCH|token" for each entry of self.symbols
+        self._symbols_lock = threading.Lock() # ATM lookups register from worker threads
+        # Tick path: one dict lookup token -> dense idx, then per-idx lists
+        self._token_to_idx: Dict[str, int] = {}
+        self._sym_by_idx: List[str] = []
+        self._is_tracked: List[bool] = [] # symbol in tracked_stocks
+        self._vwap_id: List[int] = [] # row in self.vwap
         
         from core.instruments import InstrumentManager
         self.instrument_mgr = InstrumentManager()
         self.tracked_atms: Dict[str, float] = {} # Symbol -> Current ATM Strike
-        self.vwap_map = {} # Symbol -> {cum_vol, cum_pv, last_vol}
+        # ATM option lookups run on a small pool; a (symbol, strike) already being
+        # looked up is not queued again when the strike flips back and forth
+        self._atm_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='atm_sub')
+        self._atm_inflight = set()
+        self._atm_lock = threading.Lock()
+        # Auto-trade orders are sent from here so the broker round-trip stays off the tick path
+        self._order_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='order')
+        # ...and their outcomes are applied by a single thread, in completion order
+        self._order_events: "queue.SimpleQueue[OrderEvent]" = queue.SimpleQueue()
+        # Entry orders whose OrderEvent is not applied yet, and exits held back
+        # until then (an exit reads current_symbol, which the entry's event sets)
+        self._order_lock = threading.Lock()
+        self._entries_inflight = 0
+        self._parked_exits: List[Tuple[Signal, float]] = []
+        # Positions with a trailing-stop exit submitted and not yet filled or
+        # rejected, and the exit order ids -> position
+        self._exit_pending = set()
+        self._exit_orders: Dict[str, tuple] = {}
+        threading.Thread(target=self._consume_order_events, name="OrderEvents", daemon=True).start()
+        self.vwap = VwapBook() # Intraday VWAP state per symbol
         self.tracked_stocks = set() # Set of underlying symbols to track for ATMs
         self.macro_data = {} # Symbol -> {trend, rsi, message}
         self.prev_close_map = {} # Symbol -> Prev Day Close
@@ -68,6 +227,7 @@ class TickEngine:
         
         self.running = False
         self.offline = False  # Offline mode flag
+        self._tick_queue = RingQueue(TICK_QUEUE_SIZE, name="Tick queue") # (receive time ns, raw tick)
         self.order_history = [] 
         try:
             from core.database import db
@@ -117,10 +277,8 @@ class TickEngine:
         
         if self.offline:
             # Populate with fallback tokens
-            self.token_map['BANKNIFTY'] = FALLBACK_BANKNIFTY
-            self.reverse_token_map[FALLBACK_BANKNIFTY] = 'BANKNIFTY'
-            self.token_map['HDFCBANK'] = FALLBACK_HDFCBANK
-            self.reverse_token_map[FALLBACK_HDFCBANK] = 'HDFCBANK'
+            self._register_symbol('BANKNIFTY', FALLBACK_BANKNIFTY)
+            self._register_symbol('HDFCBANK', FALLBACK_HDFCBANK)
             logger.info("Offline Mode: using hardcoded tokens.")
             return
 
@@ -136,9 +294,8 @@ class TickEngine:
                         break
                 
                 if token:
-                    self.token_map[symbol] = token
-                    self.reverse_token_map[token] = symbol
-                    self.tracked_stocks.add(symbol) # Mark as underlying for ATM tracking
+                    self._register_symbol(symbol, token)
+                    self._track(symbol) # Mark as underlying for ATM tracking
                     logger.info(f"Resolved {symbol} -> {token}")
                 else:
                     logger.error(f"Could not find exact match for {symbol} in results: {ret['values']}")
@@ -153,8 +310,7 @@ class TickEngine:
                 # Look for the index, not futures or ETFs
                 if item.get('instname') == 'UNDIND' or 'NIFTY BANK' in item.get('cname', ''):
                     token = item['token']
-                    self.token_map["BANKNIFTY"] = token
-                    self.reverse_token_map[token] = "BANKNIFTY"
+                    self._register_symbol("BANKNIFTY", token)
                     logger.info(f"Resolved BANKNIFTY -> {token}")
                     banknifty_found = True
                     break
@@ -163,37 +319,63 @@ class TickEngine:
         if not banknifty_found:
             logger.warning("Search failed for BANKNIFTY, using hardcoded token 26009")
             token = "26009"  # NSE Bank Nifty index token
-            self.token_map["BANKNIFTY"] = token
-            self.reverse_token_map[token] = "BANKNIFTY"
+            self._register_symbol("BANKNIFTY", token)
             logger.info(f"Resolved BANKNIFTY -> {token} (hardcoded)")
         
-        # DEBUG: Check Singleton
-        from core.market_data import market_data
-        logger.info(f"DEBUG: feed.py market_data ID: {id(market_data)}")
-        try:
-            with open("debug_feed_id.txt", "w") as f:
-                f.write(str(id(market_data)))
-        except:
-            pass
+        # DEBUG: Check Singleton (the web server must see this same market_data)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("feed.py market_data ID: %s", id(market_data))
+            try:
+                with open("debug_feed_id.txt", "w") as f:
+                    f.write(str(id(market_data)))
+            except OSError:
+                pass
         
         # Ensure BANKNIFTY is in tracked stocks for seeding
         if "BANKNIFTY" in self.token_map:
-            self.tracked_stocks.add("BANKNIFTY")
+            self._track("BANKNIFTY")
 
         if "BANKNIFTY" not in self.token_map:
              logger.error("Could not resolve BANKNIFTY token!")
 
+    def _register_symbol(self, symbol: str, token: str, exchange: str = "NSE"):
+        """Record a resolved token in the lookup maps and the subscription list"""
+        with self._symbols_lock:
+            self.token_map[symbol] = token
+            self.reverse_token_map[token] = symbol
+
+            idx = self._token_to_idx.get(token)
+            if idx is None:
+                self._sym_by_idx.append(symbol)
+                self._is_tracked.append(symbol in self.tracked_stocks)
+                self._vwap_id.append(self.vwap.index(symbol))
+                self._token_to_idx[token] = len(self._sym_by_idx) - 1 # published last
+            else:
+                self._sym_by_idx[idx] = symbol
+                self._is_tracked[idx] = symbol in self.tracked_stocks
+                self._vwap_id[idx] = self.vwap.index(symbol)
+
+            for i, (_, tok, exch) in enumerate(self.symbols):
+                if tok == token and exch == exchange:
+                    self.symbols[i] = (symbol, token, exchange)
+                    return
+            self.symbols.append((symbol, token, exchange))
+            self._sub_strings.append(f"{exchange}|{token}")
+
+    def _track(self, symbol: str):
+        """Add an underlying to tracked_stocks (ATM tracking, weightage, seeding)"""
+        with self._symbols_lock:
+            self.tracked_stocks.add(symbol)
+            for i, sym in enumerate(self._sym_by_idx):
+                if sym == symbol:
+                    self._is_tracked[i] = True
+
     def start(self):
         """Start the WebSocket feed and strategy loop."""
         self.running = True
         
-        # Subscribe List
-        instruments = []
-        for symbol, token in self.token_map.items():
-            # Bank Nifty is on NSE, constituents are also on NSE
-            exchange = "NSE"
-            instruments.append(f"{exchange}|{token}")
-            
+        # Subscribe List (built as tokens were resolved)
+        instruments = self._sub_strings
         logger.info(f"Subscribing to {len(instruments)} instruments: {instruments}")
 
         # Seed History (Fetch data from 9:15 AM today to calculate VWAP)
@@ -205,10 +387,16 @@ class TickEngine:
         # Fetch Macro Data (Background update)
         threading.Thread(target=self._update_macro_data).start()
         
+        # Tick processing runs off the broker's WebSocket thread
+        threading.Thread(target=self._consume_ticks, name="TickConsumer", daemon=True).start()
+        
         def on_ws_connect():
             # Small delay to ensure WebSocket is fully ready
             time.sleep(0.5)
             logger.info("WebSocket ready, subscribing to instruments...")
+            # Includes ATM options registered since start(), so a reconnect resubscribes them too
+            with self._symbols_lock:
+                instruments = list(self._sub_strings)
             self.shoonya.subscribe(instruments)
         
         self.shoonya.start_websocket(
@@ -226,121 +414,97 @@ class TickEngine:
 
     def stop(self):
         self.running = False
+        self._tick_queue.put((0, None))
+        self._atm_pool.shutdown(wait=False)
+        self._order_pool.shutdown(wait=False)
         self.shoonya.close_websocket()
         logger.info("TickEngine stopped.")
 
+    def _parse_tick(self, tick: dict, ts_ns: int) -> Optional[Tick]:
+        """Convert a raw broker tick once; None for unknown tokens or bad data"""
+        # tick format: {'t': 'tk', 'e': 'NSE', 'tk': '1234', 'lp': '100.5', 'v': '1000', ...}
+        idx = self._token_to_idx.get(tick.get('tk'))
+        if idx is None:
+            return None
+        get = tick.get
+        try:
+            price = float(get('lp', 0))
+            if price == 0:
+                return None
+            change = get('c')
+            return Tick(
+                idx, self._sym_by_idx[idx], price,
+                int(get('v', 0)), # This might be cumulative volume
+                float(get('o', 0)), float(get('h', 0)), float(get('l', 0)),
+                float(change) if change is not None else None,
+                float(get('pc', 0)),
+                ts_ns
+            )
+        except (TypeError, ValueError):
+            logger.debug(f"Dropping malformed tick: {tick}")
+            return None
+
     def on_tick(self, tick: dict):
+        """Broker WebSocket callback: stamp the tick and hand it to the consumer
+        thread, so slow processing never backs up the receive loop. When the
+        queue is full the oldest tick is dropped (a newer price supersedes it)."""
+        self._tick_queue.put((time.time_ns(), tick))
+
+    def _consume_ticks(self):
+        """Tick consumer thread: processes queued ticks in arrival order"""
+        get = self._tick_queue.get
+        while True:
+            ts_ns, tick = get()
+            if tick is None: # stop()
+                break
+            try:
+                self._process_tick(tick, ts_ns)
+            except Exception as e:
+                logger.error(f"Tick processing failed: {e}", exc_info=True)
+
+    def _process_tick(self, tick: dict, ts_ns: int):
         """Handle incoming tick."""
-        # tick format: {'t': 'tk', 'e': 'NSE', 'tk': '1234', 'lp': '100.5', 'v': '1000', ...}
-        token = tick.get('tk')
-        if not token:
-            return
-            
-        symbol = self.reverse_token_map.get(token)
-        if not symbol:
-            return
-            
-        price = float(tick.get('lp', 0))
-        volume = int(tick.get('v', 0)) # This might be cumulative volume
-        timestamp = datetime.now(IST) # Use IST
-        
-        if price == 0:
+        t = self._parse_tick(tick, ts_ns)
+        if t is None:
             return
+        idx, symbol, price, volume = t.idx, t.symbol, t.price, t.volume
+        is_tracked = self._is_tracked[idx]
+        ts_ns = t.ts_ns
+        timestamp = ts_ns / 1e9
 
-        # Update VWAP Stats
-        if symbol not in self.vwap_map:
-             self.vwap_map[symbol] = {'cum_vol': 0, 'cum_pv': 0}
-        
-        # Calculate Tick Volume (naive difference)
+        # Update VWAP Stats (NaN until the symbol has traded volume)
         # Note: 'v' in tick is usually cumulative for the day
-        current_vol = int(tick.get('v', 0))
-        if current_vol > 0:
-             last_vol = self.vwap_map[symbol].get('last_vol', 0)
-             if current_vol > last_vol:
-                 vol_delta = current_vol - last_vol
-                 self.vwap_map[symbol]['cum_vol'] += vol_delta
-                 self.vwap_map[symbol]['cum_pv'] += (price * vol_delta)
-                 self.vwap_map[symbol]['last_vol'] = current_vol
-        
-        # 1. Resolve Benchmark (Prev Close)
-        prev_close = self.prev_close_map.get(symbol, 0.0)
-        if prev_close == 0:
-            if 'pc' in tick:
-                prev_close = float(tick.get('pc', 0))
-            elif 'c' in tick and 'lp' in tick:
-                # Deduce pc from change: pc = lp - change
-                prev_close = float(tick['lp']) - float(tick['c'])
-        
-        # 2. Calculate Intraday Trend
-        trend = "NEUTRAL"
-        if current_vol > 0:
-            # Stocks with volume use VWAP for trend
-            vwap = self.vwap_map[symbol]['cum_pv'] / self.vwap_map[symbol]['cum_vol']
-            if price > vwap: trend = "BULLISH"
-            elif price < vwap: trend = "BEARISH"
-        else:
-            # Indices/Low-Volume use Price vs Benchmark
-            if prev_close > 0:
-                if price > prev_close: trend = "BULLISH"
-                elif price < prev_close: trend = "BEARISH"
-        
-        # 3. Calculate VWAP for payload
-        vwap = price
-        if current_vol > 0 or self.vwap_map[symbol]['cum_vol'] > 0:
-             vwap = self.vwap_map[symbol]['cum_pv'] / self.vwap_map[symbol]['cum_vol']
+        current_vol = volume
+        tick_vwap = self.vwap.update_at(self._vwap_id[idx], price, current_vol)
+        has_vwap = not math.isnan(tick_vwap)
+        vwap = tick_vwap if has_vwap else price
 
         # --- WEB DASHBOARD UPDATE ---
-        try:
-            # Import here to avoid circular dependencies if any
-            from core.market_data import market_data
-            
-            # 4. Calculate Change and Percent Change
-            change = 0.0
-            percent_change = 0.0
-            
-            if prev_close > 0:
-                change = price - prev_close
-                percent_change = (change / prev_close) * 100
-            elif 'c' in tick:
-                # Absolute change from Shoonya
-                change = float(tick['c'])
-                percent_change = (change / price * 100) if price > 0 else 0.0
-            
-            # Sanity check for bad data
-            if abs(percent_change) > 1000:
-                percent_change = 0.0
-                change = 0.0
-                
-            payload = {
-                'symbol': symbol,
-                'ltp': price,
-                'volume': volume,
-                'open': float(tick.get('o', 0)),
-                'high': float(tick.get('h', 0)),
-                'low': float(tick.get('l', 0)),
-                'change': change,
-                'percent_change': percent_change,
-                'vwap': vwap,
-                'trend': trend,
-                'macro': self.macro_data.get(symbol, {}),
-                'ai_signal': self._calculate_ai_signal(symbol, price, percent_change, vwap) if symbol == 'BANKNIFTY' else None,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            # Fire-and-forget update
-            if hasattr(market_data, 'latest_prices'):
-                market_data.latest_prices[symbol] = payload
-        except Exception:
-            pass
+        # Skipped while nobody is watching: only the LTP is kept current (order
+        # paths read it from latest_prices); the full payload resumes with the UI
+        p = self._payloads.get(symbol)
+        if p is None:
+            p = self._payloads[symbol] = self._new_payload(symbol)
+        p['ltp'] = price
+        p['volume'] = volume
+        if not self._md.ui_active:
+            self._md.store(symbol, p)
+        else:
+            try:
+                self._update_payload(p, t, has_vwap, vwap)
+                # Fire-and-forget update (wakes the web broadcaster)
+                self._md.publish(symbol, p)
+            except Exception:
+                pass
         # ----------------------------
 
         # --- ATM OPTION TRACKING (Bank Nifty Constituents) ---
         # Only run for tracked UNDERLYING stocks, not for options themselves
-        if symbol in self.tracked_stocks: 
+        if is_tracked: 
             self._check_atm_subscription(symbol, price)
 
         # Update Weightage Calculator
-        if symbol != "BANKNIFTY" and symbol in self.tracked_stocks:
+        if symbol != "BANKNIFTY" and is_tracked:
              # We assume 'o' (Open) is available in the tick or captured earlier
              # (Logic for weightage calc only needs stocks)
             if 'o' in tick:
@@ -351,8 +515,7 @@ class TickEngine:
         # Update Bank Nifty Candles & Run Strategy
         if symbol == "BANKNIFTY":
             # Update Resamplers
-            c3 = self.resampler_3m.process_tick(price, volume, timestamp)
-            c5 = self.resampler_5m.process_tick(price, volume, timestamp)
+            c3, c5 = self.resampler.process_tick(price, volume, ts_ns)
             
             if c3:
                 logger.info(f"3-min Candle Closed: {c3}")
@@ -366,16 +529,26 @@ class TickEngine:
             macro = self.macro_data.get("BANKNIFTY", {}).get('trend', "NEUTRAL")
 
             # Run Strategy (Updated with multi-factor scoring)
-            signal = self.strategy.on_tick(price, timestamp.timestamp(), vwap=vwap, macro_trend=macro)
+            signal = self.strategy.on_tick(price, timestamp, vwap=vwap, macro_trend=macro)
             
             # Automation: Check for Trailing SL Breaches
             if self.auto_trading_enabled:
-                # Check for TSL breaches in active positions
-                for (sym, prd), pos in list(self.position_manager.positions.items()):
-                    if pos["net_qty"] != 0 and self.position_manager.check_tsl_breach(sym, prd):
-                        logger.warning(f"AUTO-TSL: Breach detected for {sym}. Triggering EXIT.")
-                        tsl_signal = Signal("EXIT", sym, price, "Trailing Stop Loss Breach", timestamp.timestamp())
-                        self.execute_signal(tsl_signal)
+                # Check for TSL breaches in active positions; all exits go out together.
+                # A position whose exit is still pending is not exited again.
+                tsl_exits, breached = [], set()
+                with self._order_lock:
+                    for (sym, prd), pos in list(self.position_manager.positions.items()):
+                        if pos["net_qty"] != 0 and self.position_manager.check_tsl_breach(sym, prd):
+                            breached.add((sym, prd))
+                            if (sym, prd) in self._exit_pending:
+                                continue
+                            logger.warning(f"AUTO-TSL: Breach detected for {sym}. Triggering EXIT.")
+                            self._exit_pending.add((sym, prd))
+                            tsl_exits.append((sym, prd, pos["net_qty"]))
+                    # Closed (or no longer breached) positions need no guard
+                    self._exit_pending &= breached
+                if tsl_exits:
+                    self.exit_positions(tsl_exits, "Trailing Stop Loss Breach", timestamp, strength)
             
             if signal:
                 logger.info(f"SIGNAL GENERATED: {signal}")
@@ -383,22 +556,127 @@ class TickEngine:
                 # Log signal to orders log
                 log_signal(signal.type, signal.symbol, signal.price, strength, signal.reason)
                 
-                self.telegram.send_message(
-                    f"📊 **Signal: {signal.type}**\n"
-                    f"Price: {signal.price:.2f}\n"
-                    f"Reason: {signal.reason}"
-                )
+                if self.telegram.enabled:
+                    self._notify(
+                        f"📊 **Signal: {signal.type}**\n"
+                        f"Price: {signal.price:.2f}\n"
+                        f"Reason: {signal.reason}"
+                    )
                 
                 # Execute the signal
-                self.execute_signal(signal)
-            else:
-                self.weightage_calc.update_data(symbol, price, volume)
+                self.execute_signal(signal, strength)
 
-    def _check_atm_subscription(self, symbol: str, ltp: float):
-        """Check and subscribe to ATM options if strike changed"""
-        if not hasattr(self, 'instrument_mgr'):
+    def _notify(self, msg: str):
+        """Queue a Telegram alert; returns immediately (the oldest pending alert
+        is dropped if the sender has fallen TELEGRAM_QUEUE_SIZE behind)"""
+        self._tg_queue.put(msg)
+
+    def _alert(self, level: int, template: str, fields: dict):
+        """Log an order alert at `level` and send it to Telegram. The text is
+        only built when the log level or Telegram will actually use it."""
+        to_log = logger.isEnabledFor(level)
+        to_telegram = self.telegram.enabled
+        if not (to_log or to_telegram):
             return
+        msg = template.format_map(fields)
+        if to_log:
+            logger.log(level, msg)
+        if to_telegram:
+            self._notify(msg)
+
+    def _tg_drain(self):
+        """Telegram sender thread. Alerts queued within TELEGRAM_BATCH_WINDOW of
+        the first one go out as a single message, kept under Telegram's length
+        limit; an alert that would overflow it starts the next batch."""
+        q = self._tg_queue
+        carry = None
+        while True:
+            batch = [carry if carry is not None else q.get()]
+            carry = None
+            size = len(batch[0])
+            deadline = time.monotonic() + TELEGRAM_BATCH_WINDOW
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    msg = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if size + 2 + len(msg) > TELEGRAM_BATCH_CHARS:
+                    carry = msg
+                    break
+                batch.append(msg)
+                size += 2 + len(msg)
+            try:
+                self.telegram.send_message("\n\n".join(batch))
+            except Exception as e:
+                logger.error(f"Telegram send failed: {e}")
+
+    def _new_payload(self, symbol: str) -> dict:
+        """A symbol's payload dict, starting from its seeded values. Every key is
+        present from the start: the dict is then only mutated in place, so the
+        broadcaster can iterate it while the feed thread writes."""
+        p = dict.fromkeys(_PAYLOAD_KEYS)
+        p.update(self._md.latest_prices.get(symbol, ()))
+        p['symbol'] = symbol
+        return p
+
+    def _update_payload(self, p: dict, t: Tick, has_vwap: bool, vwap: float):
+        """Fill the dashboard fields of a symbol's payload in place"""
+        symbol, price = t.symbol, t.price
+        
+        # 1. Resolve Benchmark (Prev Close)
+        prev_close = self.prev_close_map.get(symbol, 0.0)
+        if prev_close == 0:
+            if t.prev_close:
+                prev_close = t.prev_close
+            elif t.change is not None:
+                # Deduce pc from change: pc = lp - change
+                prev_close = price - t.change
+        
+        # 2. Calculate Intraday Trend
+        trend = "NEUTRAL"
+        if t.volume > 0 and has_vwap:
+            # Stocks with volume use VWAP for trend
+            if price > vwap: trend = "BULLISH"
+            elif price < vwap: trend = "BEARISH"
+        else:
+            # Indices/Low-Volume use Price vs Benchmark
+            if prev_close > 0:
+                if price > prev_close: trend = "BULLISH"
+                elif price < prev_close: trend = "BEARISH"
+        
+        # 3. Calculate Change and Percent Change
+        change = 0.0
+        percent_change = 0.0
+        
+        if prev_close > 0:
+            change = price - prev_close
+            percent_change = (change / prev_close) * 100
+        elif t.change is not None:
+            # Absolute change from Shoonya
+            change = t.change
+            percent_change = (change / price * 100) if price > 0 else 0.0
+        
+        # Sanity check for bad data
+        if abs(percent_change) > 1000:
+            percent_change = 0.0
+            change = 0.0
+        
+        p['open'] = t.open
+        p['high'] = t.high
+        p['low'] = t.low
+        p['change'] = change
+        p['percent_change'] = percent_change
+        p['vwap'] = vwap
+        p['trend'] = trend
+        p['macro'] = self.macro_data.get(symbol, {})
+        p['ai_signal'] = self._calculate_ai_signal(symbol, price, percent_change, vwap) if symbol == 'BANKNIFTY' else None
+        p['timestamp'] = iso_now()
 
+    def _check_atm_subscription(self, symbol: str, ltp: float):
+        """Check and subscribe to ATM options if strike changed"""
         # Simple throttling/hysteresis could be added here
         # For now, calculate ATM
         atm_strike = self.instrument_mgr.calculate_atm_strike(symbol, ltp)
@@ -420,7 +698,17 @@ class TickEngine:
             self.tracked_atms[symbol] = atm_strike
             
             # Trigger background subscription task
-            threading.Thread(target=self._subscribe_atm_options, args=(symbol, atm_strike)).start()
+            key = (symbol, atm_strike)
+            with self._atm_lock:
+                if key in self._atm_inflight:
+                    return
+                self._atm_inflight.add(key)
+            fut = self._atm_pool.submit(self._subscribe_atm_options, symbol, atm_strike)
+            fut.add_done_callback(lambda f: self._atm_done(key))
+
+    def _atm_done(self, key):
+        with self._atm_lock:
+            self._atm_inflight.discard(key)
 
     def _subscribe_atm_options(self, symbol: str, strike: float):
         """Find and subscribe to ATM options (Local Lookup)"""
@@ -438,8 +726,7 @@ class TickEngine:
                     tsym = ce['tsym']
                     logger.info(f"✅ Subscribing CE: {tsym} ({token})")
                     self.shoonya.subscribe(f'NFO|{token}')
-                    self.token_map[tsym] = token
-                    self.reverse_token_map[token] = tsym
+                    self._register_symbol(tsym, token, 'NFO')
                     
                 # Subscribe PE
                 if 'PE' in options:
@@ -448,8 +735,7 @@ class TickEngine:
                     tsym = pe['tsym']
                     logger.info(f"✅ Subscribing PE: {tsym} ({token})")
                     self.shoonya.subscribe(f'NFO|{token}')
-                    self.token_map[tsym] = token
-                    self.reverse_token_map[token] = tsym
+                    self._register_symbol(tsym, token, 'NFO')
             else:
                 logger.warning(f"No options found in master file for {symbol} {strike}")
 
@@ -466,8 +752,6 @@ class TickEngine:
             
             # Fetch last 3 days to ensure we have data for UI even on Monday mornings
             # But only calculate VWAP for TODAY
-            # But only calculate VWAP for TODAY
-            from datetime import timedelta
             search_start_time = now_ist - timedelta(days=3)
             start_ts = search_start_time.timestamp()
 
@@ -479,52 +763,37 @@ class TickEngine:
                 history = self.shoonya.get_history(exchange="NSE", token=token, start_time=start_ts, interval=1)
                 
                 if history and isinstance(history, list):
-                    # Process candles chronologically
-                    history.sort(key=lambda x: x.get('time', ''))
+                    # Process candles chronologically. The broker returns them newest-first,
+                    # so an O(n) reverse suffices (sorting the 'dd-mm-yyyy' strings was
+                    # both O(n log n) and wrong across month boundaries)
+                    history.reverse()
                     
-                    cum_vol = 0
-                    cum_pv = 0.0
+                    # Parse the whole day's candles at once (Format: 'dd-MM-yyyy HH:mm:ss');
+                    # rows with a malformed time are dropped, a malformed price below
+                    df = pd.DataFrame(history)
+                    t = pd.to_datetime(df['time'], format='%d-%m-%Y %H:%M:%S', errors='coerce').dt.tz_localize(IST)
+                    rows = np.flatnonzero(t.notna().to_numpy()) # positions in `history`
+                    t = t.iloc[rows]
                     
+                    # Candles are in time order: today's session starts at one split point
+                    split = int(t.searchsorted(start_of_day))
+                    today = df.iloc[rows[split:]]
+                    close = pd.to_numeric(today['intc'], errors='coerce').to_numpy(dtype=np.float64)
+                    vol = pd.to_numeric(today['intv'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+
                     # VWAP Calculation (Strictly Today)
-                    for candle in history:
-                         candle_time_str = candle.get('time', '') # Format: 'dd-MM-yyyy HH:mm:ss'
-                         # Parse time if needed, or simplistically: 
-                         # Shoonya returns time as string. 
-                         # For now, let's assume if it matches today's date string?
-                         # Simpler: just use all history if it's today, otherwise filter.
-                         # Given robustness need: Let's calc VWAP from ALL returned history? 
-                         # NO, VWAP must be intraday.
-                         
-                         # Check if candle is from today
-                         try:
-                             c_time = datetime.strptime(candle_time_str, "%d-%m-%Y %H:%M:%S").replace(tzinfo=IST)
-                             if c_time >= start_of_day:
-                                 c = float(candle.get('intc', 0))
-                                 v = int(candle.get('intv', 0))
-                                 if v > 0:
-                                     cum_vol += v
-                                     cum_pv += (c * v)
-                         except:
-                             pass # validation error, skip
-                    
-                    # Update Map
-                    if symbol not in self.vwap_map:
-                         self.vwap_map[symbol] = {'cum_vol': 0, 'cum_pv': 0, 'last_vol': cum_vol}
-                    
-                    if cum_vol > 0:
-                         self.vwap_map[symbol]['cum_vol'] = cum_vol
-                         self.vwap_map[symbol]['cum_pv'] = cum_pv
-                     
+                    traded = (vol > 0) & ~np.isnan(close)
+                    cum_vol = int(vol[traded].sum())
+                    cum_pv = float((close[traded] * vol[traded]).sum())
+
+                    # Update VWAP state
+                    self.vwap.seed(symbol, cum_vol, cum_pv, last_vol=cum_vol)
+
                     # Identify Day Open (First candle of today)
                     day_open_price = 0.0
-                    for candle in history:
-                        try:
-                            c_time = datetime.strptime(candle.get('time', ''), "%d-%m-%Y %H:%M:%S").replace(tzinfo=IST)
-                            if c_time >= start_of_day:
-                                day_open_price = float(candle.get('into', 0))
-                                break
-                        except: continue
-                    
+                    if len(today):
+                        day_open_price = float(pd.to_numeric(today['into'].iloc[0], errors='coerce'))
+
                     if day_open_price > 0:
                          self.weightage_calc.set_open_price(symbol, day_open_price)
 
@@ -535,20 +804,13 @@ class TickEngine:
                         close_price = float(last_candle.get('intc', 0))
                         
                         # Identify Previous Close (Last candle that is NOT from today)
-                        prev_day_candle = None
-                        for candle in reversed(history):
-                             try:
-                                 c_time = datetime.strptime(candle.get('time', ''), "%d-%m-%Y %H:%M:%S").replace(tzinfo=IST)
-                                 if c_time < start_of_day:
-                                     prev_day_candle = candle
-                                     break
-                             except: continue
-                        
+                        prev_day_candle = history[rows[split - 1]] if split > 0 else None
+
                         if prev_day_candle:
                             self.prev_close_map[symbol] = float(prev_day_candle.get('intc', 0))
                             logger.info(f"SET PREV CLOSE {symbol}: {self.prev_close_map[symbol]}")
                         
-                        logger.info(f"DEBUG: Seeding {symbol} with close_price={close_price}")
+                        logger.debug("Seeding %s with close_price=%s", symbol, close_price)
 
                         # Fake payload to initialize UI
                         cur_prev_close = self.prev_close_map.get(symbol, close_price)
@@ -571,29 +833,26 @@ class TickEngine:
                             'timestamp': datetime.now(IST).isoformat()
                         }
                         
-                        from core.market_data import market_data
-                        if hasattr(market_data, 'latest_prices'):
-                            market_data.latest_prices[symbol] = payload
+                        market_data.publish(symbol, payload)
                     else:
-                        logger.warning(f"DEBUG: No history for {symbol} - UI will be empty")
+                        logger.warning("No history for %s - UI will be empty", symbol)
                     # ------------------------------------------------------------------
 
                     # Update current VWAP for logging
-                    if self.vwap_map[symbol].get('cum_vol', 0) > 0:
-                        vwap = self.vwap_map[symbol]['cum_pv'] / self.vwap_map[symbol]['cum_vol']
+                    seeded_vol, vwap = self.vwap.get(symbol)
+                    if seeded_vol > 0:
                         logger.info(f"SEED {symbol}: VWAP={vwap:.2f}, Vol={cum_vol}")
                 else:
-                    logger.warning(f"DEBUG: History API returned empty/invalid for {symbol}: {history}")
+                    logger.warning("History API returned empty/invalid for %s: %s", symbol, history)
 
 
         except Exception as e:
             logger.error(f"Error seeding history: {e}", exc_info=True)
             
         # FINAL FALLBACK: If BANKNIFTY is missing from UI, force dummy data
-        from core.market_data import market_data
         if 'BANKNIFTY' not in market_data.latest_prices:
             logger.warning("⚠️ FORCE SEEDING BANKNIFTY DUMMY DATA (API Failed) ⚠️")
-            market_data.latest_prices['BANKNIFTY'] = {
+            market_data.publish('BANKNIFTY', {
                 'symbol': 'BANKNIFTY',
                 'ltp': 51500.0, 'change': 150.0, 'percent_change': 0.29,
                 'open': 51400.0, 'high': 51600.0, 'low': 51300.0, 'close': 51350.0,
@@ -603,7 +862,7 @@ class TickEngine:
                 'macro': {},
                 'ai_signal': 'OFFLINE (NEUTRAL)',
                 'timestamp': datetime.now(IST).isoformat()
-            }
+            })
 
     def _update_macro_data(self):
         """Fetch 30-day hourly history for macro trend analysis. Loops every hour."""
@@ -612,28 +871,7 @@ class TickEngine:
             try:
                 now = datetime.now(IST)
                 start_time = now - timedelta(days=30)
-                
-                for symbol in self.tracked_stocks:
-                    token = self.token_map.get(symbol)
-                    if not token: continue
-                    
-                    # Fetch hourly (interval=60)
-                    history = self.shoonya.get_history(exchange="NSE", token=token, 
-                                                     start_time=start_time.timestamp(), 
-                                                     interval="60")
-                    
-                    if history and isinstance(history, list):
-                         df = pd.DataFrame(history)
-                         df['close'] = pd.to_numeric(df['intc'])
-                         
-                         indicators = TechnicalIndicators.calculate_macro_trend(df)
-                         self.macro_data[symbol] = indicators
-                         logger.debug(f"MACRO {symbol} REFRESHED: {indicators}")
-                         
-                         time.sleep(0.5) # Throttling API calls
-                    else:
-                        logger.warning(f"No macro history for {symbol}")
-                        
+                asyncio.run(self._refresh_macro_data(start_time.timestamp()))
             except Exception as e:
                  logger.error(f"Macro Data Loop Error: {e}")
             
@@ -642,6 +880,36 @@ class TickEngine:
                 if not self.running: break
                 time.sleep(1)
 
+    async def _refresh_macro_data(self, start_ts: float):
+        """Fetch every tracked symbol's hourly history concurrently, at most
+        MACRO_FETCH_CONCURRENCY broker calls in flight (replaces a serial loop
+        with a 0.5s sleep between calls)"""
+        loop = asyncio.get_running_loop()
+        sem = asyncio.Semaphore(MACRO_FETCH_CONCURRENCY)
+
+        async def refresh(symbol: str, token: str):
+            try:
+                async with sem:
+                    # Fetch hourly (interval=60)
+                    history = await loop.run_in_executor(None, partial(
+                        self.shoonya.get_history, exchange="NSE", token=token,
+                        start_time=start_ts, interval="60"))
+                
+                if history and isinstance(history, list):
+                    # Broker returns bars newest-first; the indicators want oldest first
+                    close = np.array([x['intc'] for x in reversed(history)], dtype=np.float64)
+                    
+                    indicators = TechnicalIndicators.macro_trend(close)
+                    self.macro_data[symbol] = indicators
+                    logger.debug(f"MACRO {symbol} REFRESHED: {indicators}")
+                else:
+                    logger.warning(f"No macro history for {symbol}")
+            except Exception as e:
+                logger.error(f"Macro refresh failed for {symbol}: {e}")
+
+        targets = [(s, self.token_map.get(s)) for s in list(self.tracked_stocks)]
+        await asyncio.gather(*(refresh(s, token) for s, token in targets if token))
+
     def on_order_update(self, data):
         """Handle order updates from WebSocket"""
         logger.info(f"Order Update: {data}")
@@ -663,8 +931,9 @@ class TickEngine:
         
         # Trigger Position Update on Full Fill
         if status == 'COMPLETE' and fill_qty > 0:
-            if hasattr(self, 'position_manager'):
-                self.position_manager.on_fill(symbol, fill_qty, fill_price, side, product)
+            self.position_manager.on_fill(symbol, fill_qty, fill_price, side, product)
+        if status in ('COMPLETE', 'REJECTED', 'CANCELED'):
+            self._exit_order_done(order_id)
         
         # Update existing order in history if found, else insert
         found = False
@@ -698,7 +967,8 @@ class TickEngine:
             if self.db: self.db.save_order(order_data)
             if len(self.order_history) > 50: self.order_history.pop()
 
-        self.telegram.send_message(f"📊 Order Update: {status} ({symbol})")
+        if self.telegram.enabled:
+            self._notify(f"📊 Order Update: {status} ({symbol})")
         
     def place_manual_order(self, symbol: str, side: str, qty: int, price: float = 0.0, product_type: str = 'I'):
         """
@@ -720,7 +990,8 @@ class TickEngine:
         
         if order_id:
             # ... (success logic)
-            ltp = market_data.latest_prices.get(symbol, {}).get('ltp', 0.0)
+            p = self._md.latest_prices.get(symbol)
+            ltp = p['ltp'] if p else 0.0
             order_data = {
                 'id': order_id,
                 'symbol': symbol,
@@ -787,17 +1058,19 @@ class TickEngine:
             return {"status": "success", "gtt_id": gtt_id}
         return {"status": "error"}
 
-    def _simulate_manual_order(self, symbol: str, side: str, qty: int, price: float = 0.0, reason: str = "SIM"):
+    def _simulate_manual_order(self, symbol: str, side: str, qty: int, price: float = 0.0, reason: str = "SIM",
+                               product_type: str = 'I'):
         """Helper to simulate an offline order"""
         logger.warning(f"Simulation Mode ({reason}): {side} {qty} {symbol}")
         order_id = f"SIM-{int(time.time())}"
         
         # Simulate Fill
-        ltp = market_data.latest_prices.get(symbol, {}).get('ltp', 0.0)
+        p = self._md.latest_prices.get(symbol)
+        ltp = p['ltp'] if p else 0.0
         fill_price = price if price > 0 else ltp
         if fill_price == 0: fill_price = 100.0 # Fallback default
 
-        self.position_manager.on_fill(symbol, qty, fill_price, side)
+        self.position_manager.on_fill(symbol, qty, fill_price, side, product_type)
         
         # Log to history
         order_data = {
@@ -834,7 +1107,7 @@ class TickEngine:
         if isinstance(macro, list): macro = macro[0]
         
         # 3. Get Momentum (Relative to 2 mins ago)
-        timestamp = datetime.now().timestamp()
+        timestamp = time.time()
         
         # We reuse the same history buffer if possible or maintain one here
         # For dashboard simplicity, we'll store on the class
@@ -884,35 +1157,77 @@ class TickEngine:
         
         return signal
 
-    def execute_signal(self, signal):
-        """Execute the signal by placing an order for Bank Nifty options."""
+    def exit_positions(self, exits: List[Tuple[str, str, int]], reason: str, timestamp: float,
+                       strength: Optional[float] = None):
+        """Close several positions at once, each given as (symbol, product, net_qty).
+
+        Every exit trades the position's own contract, product and size (a SELL
+        for a long, a BUY for a short), like OrderManager.close_all_positions.
+        Live orders are only submitted to the order pool here, so the legs are
+        placed concurrently rather than each waiting for the previous broker
+        response. The caller marks each position exit-pending; the mark is
+        cleared when its order is rejected or fills.
+        """
+        if strength is None:
+            strength = self.weightage_calc.calculate_weighted_strength()
+        strength = abs(strength)
+        for sym, prd, net_qty in exits:
+            side = "SELL" if net_qty > 0 else "BUY"
+            qty = abs(net_qty)
+            p = self._md.latest_prices.get(sym)
+            signal = Signal("EXIT", sym, p['ltp'] if p else 0.0, reason, timestamp)
+            match = _STRIKE_RE.search(sym)
+            strike = int(match.group(2)) if match else "-"
+            logger.info(f"EXITING {sym} ({prd}): {side} {qty}")
+            log_order_attempt(side[0], sym, qty, strike)
+
+            if self.offline or config.PAPER_TRADING_MODE:
+                # Simulated fill: the position is flat again, nothing stays pending
+                self._simulate_manual_order(sym, side, qty, reason="PAPER_TSL", product_type=prd)
+                with self._order_lock:
+                    self._exit_pending.discard((sym, prd))
+                continue
+
+            fut = self._order_pool.submit(self.order_manager.place_order, sym, side, qty,
+                                          product_type=prd, tag="TSL_EXIT")
+            fut.add_done_callback(partial(self._on_order_result, signal, sym, qty, side[0], strike,
+                                          strength, (sym, prd)))
+
+    def execute_signal(self, signal, strength: Optional[float] = None):
+        """Execute the signal by placing an order for Bank Nifty options.
+        
+        `strength` is the weighted index strength the caller already has for
+        this tick; it is computed here when not given.
+        """
+        if signal.type not in _ENTRY_TYPES:
+            with self._order_lock:
+                if self._entries_inflight:
+                    # Exit strike comes from current_symbol: wait for the entry's result
+                    logger.info(f"Holding {signal.type} until in-flight entry orders are applied")
+                    self._parked_exits.append((signal, strength))
+                    return
+        
         logger.info(f"EXECUTING {signal.type} @ {signal.price}")
         
         # Get current Bank Nifty price
         current_price = signal.price
         
-        # Calculate weighted strength for strike selection
-        strength = abs(self.weightage_calc.calculate_weighted_strength())
+        # Weighted strength for strike selection and alerts
+        if strength is None:
+            strength = self.weightage_calc.calculate_weighted_strength()
+        strength = abs(strength)
         
         # Smart Strike Selection based on signal strength
         # Goal: ~50% probability (Delta ~0.5) with leverage on strong signals
         
         base_atm = round(current_price / 100) * 100  # ATM strike
         
-        if signal.type in ["BUY_CE", "BUY_PE"]:
+        # Option type (C for Call, P for Put - NOT CE/PE!)
+        option_type = "C" if "CE" in signal.type else "P"
+        
+        if signal.type in _ENTRY_TYPES:
             # For entry signals, select strike based on strength
-            if strength > 8.0:
-                # Very strong signal: Go 2 strikes OTM for better leverage
-                # Delta ~0.40-0.45, probability ~45%
-                offset = 200
-            elif strength > 6.5:
-                # Strong signal: Go 1 strike OTM
-                # Delta ~0.45-0.48, probability ~47%
-                offset = 100
-            else:
-                # Moderate signal: ATM for higher probability
-                # Delta ~0.50, probability ~50%
-                offset = 0
+            offset = _STRIKE_OFFSETS[bisect_left(_STRENGTH_THRESHOLDS, strength)]
             
             # Apply offset in correct direction
             if "CE" in signal.type:
@@ -926,9 +1241,10 @@ class TickEngine:
             # Extract strike from stored symbol
             if self.current_symbol and "BANKNIFTY" in self.current_symbol:
                 # Extract strike from symbol like "BANKNIFTY30DEC25C59600"
-                match = re.search(r'[CP](\d+)$', self.current_symbol)
+                match = _STRIKE_RE.search(self.current_symbol)
                 if match:
-                    strike = int(match.group(1))
+                    # Close the same contract: its option type and strike
+                    option_type, strike = match.group(1), int(match.group(2))
                     logger.info(f"EXIT using entry strike: {strike}")
                 else:
                     strike = base_atm
@@ -937,26 +1253,11 @@ class TickEngine:
                 strike = base_atm
                 logger.warning("No stored symbol for exit, using ATM")
         
-        # Determine option type  (C for Call, P for Put - NOT CE/PE!)
-        option_type = "C" if "CE" in signal.type else "P"
-        
         # Get current month's expiry date (last Wednesday)
-        import calendar
-        
         today = datetime.now()
         year = today.year
         month = today.month
-        
-        # Find last Wednesday of current month
-        # Get number of days in month
-        last_day = calendar.monthrange(year, month)[1]
-        
-        # Check each day from end of month backwards
-        for day in range(last_day, 0, -1):
-            date = datetime(year, month, day)
-            if date.weekday() == 2:  # Wednesday is 2
-                expiry_date = date
-                break
+        expiry_date = _last_wednesday(year, month)
         
         # If today is after monthly expiry, get next month's expiry
         if today > expiry_date or (today.date() == expiry_date.date() and today.hour >= 15):
@@ -966,13 +1267,7 @@ class TickEngine:
                 month = 1
             else:
                 month += 1
-            
-            last_day = calendar.monthrange(year, month)[1]
-            for day in range(last_day, 0, -1):
-                date = datetime(year, month, day)
-                if date.weekday() == 2:
-                    expiry_date = date
-                    break
+            expiry_date = _last_wednesday(year, month)
         
         # Format: BANKNIFTY25DEC24C51500 (use C/P not CE/PE!)
         expiry_str = expiry_date.strftime("%d%b%y").upper()
@@ -996,149 +1291,139 @@ class TickEngine:
         
         # === PAPER TRADING MODE ===
         if config.PAPER_TRADING_MODE:
-            if signal.type in ["BUY_CE", "BUY_PE"]:
+            if signal.type in _ENTRY_TYPES:
                 # Paper entry
                 self.paper_trading.enter_position(signal.type, signal.price, strike, qty, signal.reason)
                 self.current_entry_price = signal.price
                 
-                msg = (
-                    f"📝 PAPER ENTRY\n"
-                    f"Symbol: {symbol}\n"
-                    f"Action: {action} {qty} lots\n"
-                    f"Type: {signal.type}\n"  
-                    f"Price: ₹{signal.price:.2f}\n"
-                    f"Strike: {strike}\n"
-                    f"Strength: {strength:.2f}"
-                )
+                self._alert(logging.INFO, _TMPL_PAPER_ENTRY, {
+                    'symbol': symbol, 'action': action, 'qty': qty, 'type': signal.type,
+                    'price': signal.price, 'strike': strike, 'strength': strength,
+                })
             else:
                 # Paper exit
                 pnl = self.paper_trading.exit_position(signal.price, signal.reason)
-                pnl_display = f"₹{pnl:.2f}" if pnl else "N/A"
-                pnl_emoji = "💚" if pnl and pnl > 0 else "❌" if pnl and pnl < 0 else "⚪"
+                pnl_display, pnl_emoji = _format_pnl(pnl)
                 
-                msg = (
-                    f"📝 {pnl_emoji} PAPER EXIT\n"
-                    f"Symbol: {symbol}\n"
-                    f"Action: SELL {qty} lots\n"
-                    f"Exit Price: ₹{signal.price:.2f}\n"
-                    f"Entry Price: ₹{self.current_entry_price:.2f}\n"
-                    f"P&L: {pnl_display}"
-                )
+                self._alert(logging.INFO, _TMPL_PAPER_EXIT, {
+                    'emoji': pnl_emoji, 'symbol': symbol, 'qty': qty, 'price': signal.price,
+                    'entry_price': self.current_entry_price or 0.0, 'pnl': pnl_display,
+                })
                 self.current_entry_price = None
             
-            logger.info(msg)
-            self.telegram.send_message(msg)
             return  # Don't place real orders in paper mode
         
         # === REAL TRADING MODE ===
+        # Placed on the order pool; the result is handled in _on_order_result
+        if signal.type in _ENTRY_TYPES:
+            with self._order_lock:
+                self._entries_inflight += 1
+        fut = self._order_pool.submit(
+            self.shoonya.place_order,
+            buy_or_sell=action,
+            product_type="M",
+            exchange="NFO",
+            tradingsymbol=symbol,
+            quantity=qty,
+            discloseqty=0,
+            price_type="MKT",  # Market order
+            price=0,
+            trigger_price=None,
+            retention="DAY",
+            remarks=f"Auto-{signal.type}"
+        )
+        fut.add_done_callback(partial(self._on_order_result, signal, symbol, qty, action, strike, strength, None))
+
+    def _on_order_result(self, signal, symbol: str, qty: int, action: str, strike: int, strength: float,
+                         pos_key: Optional[tuple], fut):
+        """Done callback for an order placed by execute_signal or exit_positions
+        (runs on the order pool): records the outcome as an OrderEvent for the order-events thread"""
+        e = fut.exception()
+        if e is not None:
+            kind, order_id = "EXCEPTION", None
+        else:
+            order_id = fut.result()
+            kind = "PLACED" if order_id else "FAILED"
+        self._order_events.put(OrderEvent(kind, order_id, symbol, qty, action, strike, signal.price,
+                                          signal.type, strength, signal.reason, e, time.time(), pos_key))
+
+    def _consume_order_events(self):
+        """Order-events thread: applies order outcomes one at a time, in completion order"""
+        get = self._order_events.get
+        while True:
+            ev = get()
+            try:
+                self._handle_order_event(ev)
+            except Exception as e:
+                logger.error(f"Order result handling failed for {ev.symbol}: {e}", exc_info=True)
+
+    def _handle_order_event(self, ev: OrderEvent):
+        """Track, log and alert one order outcome, then release exits that were
+        waiting on it"""
         try:
-            order_id = self.shoonya.place_order(
-                buy_or_sell=action,
-                product_type="M",
-                exchange="NFO",
-                tradingsymbol=symbol,
-                quantity=qty,
-                discloseqty=0,
-                price_type="MKT",  # Market order
-                price=0,
-                trigger_price=None,
-                retention="DAY",
-                remarks=f"Auto-{signal.type}"
-            )
-            
-            if order_id:
-                # Track position and send detailed alert
-                if signal.type in ["BUY_CE", "BUY_PE"]:
-                    # Entry - we don't know exact fill price yet, use signal price as estimate
-                    entry_price_estimate = signal.price
-                    self.current_entry_price = entry_price_estimate
-                    
-                    # Open position in tracker
-                    self.position_tracker.open_position(
-                        symbol=symbol,
-                        entry_price=entry_price_estimate,
-                        quantity=qty,
-                        order_id=order_id
-                    )
-                    
-                    msg = (
-                        f"✅ **ENTRY ORDER PLACED**\n"
-                        f"Symbol: `{symbol}`\n"
-                        f"Action: **{action}** {qty} lots\n"
-                        f"Type: {signal.type}\n"
-                        f"Entry Price (est): ₹{entry_price_estimate:.2f}\n"
-                        f"Strike: {strike}\n"
-                        f"Order ID: {order_id}"
-                    )
-                else:
-                    # Exit - calculate P&L
-                    exit_price_estimate = signal.price
-                    pnl = self.position_tracker.close_position(
-                        exit_price=exit_price_estimate,
-                        order_id=order_id
-                    )
-                    
-                    pnl_display = f"₹{pnl:.2f}" if pnl else "N/A"
-                    pnl_emoji = "💚" if pnl and pnl > 0 else "❌" if pnl and pnl < 0 else "⚪"
-                    
-                    msg = (
-                        f"{pnl_emoji} **EXIT ORDER PLACED**\n"
-                        f"Symbol: `{symbol}`\n"
-                        f"Action: **SELL** {qty} lots\n"
-                        f"Exit Price (est): ₹{exit_price_estimate:.2f}\n"
-                        f"Entry Price (est): ₹{self.current_entry_price:.2f}\n"
-                        f"**P&L: {pnl_display}**\n"
-                        f"Order ID: {order_id}"
-                    )
-                    
-                    self.current_entry_price = None
-                
-                logger.info(msg)
-                log_order_result(order_id, symbol, qty, "PLACED")
-                self.telegram.send_message(msg)
-                
-                # Track order for exit logic
-                self.current_order_id = order_id
-                self.current_symbol = symbol
-            else:
-                # Order failed - send detailed error message
-                strength = abs(self.weightage_calc.calculate_weighted_strength())
-                
-                msg = (
-                    f"❌ **ORDER FAILED**\n"
-                    f"Symbol: `{symbol}`\n"
-                    f"Type: {signal.type}\n"
-                    f"Action: **{action}** {qty} lots\n"
-                    f"Price (signal): ₹{signal.price:.2f}\n"
-                    f"Strike: {strike}\n"
-                    f"Strength: {strength:.2f}\n"
-                    f"Reason: {signal.reason}\n"
-                    f"\n⚠️ **Failure**: API returned None\n"
-                    f"Possible causes:\n"
-                    f"- NFO segment not enabled\n"
-                    f"- Invalid symbol\n"
-                    f"- Exchange closed\n"
-                    f"- Network issue"
-                )
-                logger.error(msg)
-                log_order_result("N/A", symbol, qty, "FAILED", "API returned None")
-                self.telegram.send_message(msg)
-                
-        except Exception as e:
+            self._apply_order_event(ev)
+        finally:
+            parked = ()
+            with self._order_lock:
+                if ev.signal_type in _ENTRY_TYPES:
+                    self._entries_inflight -= 1
+                    if not self._entries_inflight:
+                        parked, self._parked_exits = self._parked_exits, []
+                if ev.pos_key is not None:
+                    if ev.kind == "PLACED":
+                        self._exit_orders[ev.order_id] = ev.pos_key
+                    else:
+                        # Rejected before reaching the exchange: allow a retry
+                        self._exit_pending.discard(ev.pos_key)
+            for signal, strength in parked:
+                self.execute_signal(signal, strength)
+
+    def _exit_order_done(self, order_id: str):
+        """An exit order filled or was rejected/cancelled: its position may be exited again"""
+        with self._order_lock:
+            pos_key = self._exit_orders.pop(order_id, None)
+            if pos_key is not None:
+                self._exit_pending.discard(pos_key)
+
+    def _apply_order_event(self, ev: OrderEvent):
+        fields = {
+            'symbol': ev.symbol, 'type': ev.signal_type, 'action': ev.action, 'qty': ev.qty,
+            'price': ev.price, 'strike': ev.strike, 'strength': ev.strength, 'reason': ev.reason,
+        }
+        if ev.kind == "EXCEPTION":
             # Exception during order placement
-            strength = abs(self.weightage_calc.calculate_weighted_strength())
+            fields['error'] = ev.error
+            self._alert(logging.ERROR, _TMPL_EXCEPTION, fields)
+            log_order_result("N/A", ev.symbol, ev.qty, "EXCEPTION", str(ev.error))
+        elif ev.kind == "FAILED":
+            # Order failed - send detailed error message
+            self._alert(logging.ERROR, _TMPL_FAILED, fields)
+            log_order_result("N/A", ev.symbol, ev.qty, "FAILED", "API returned None")
+        else:
+            fields['order_id'] = ev.order_id
+            if ev.signal_type in _ENTRY_TYPES:
+                # Entry - we don't know exact fill price yet, use signal price as estimate
+                self.current_entry_price = ev.price
+                self._alert(logging.INFO, _TMPL_ENTRY, fields)
+            else:
+                # Exit - P&L is only known once the fill comes back
+                fields['pnl'], fields['emoji'] = _format_pnl(None)
+                if ev.pos_key is not None:
+                    # Position exit: entry is the position's own average price
+                    pos = self.position_manager.positions.get(ev.pos_key) or {}
+                    fields['entry_price'] = pos.get("avg_price") or 0.0
+                else:
+                    fields['entry_price'] = self.current_entry_price or 0.0
+                self._alert(logging.INFO, _TMPL_EXIT, fields)
             
-            msg = (
-                f"❌ **ORDER EXCEPTION**\n"
-                f"Symbol: `{symbol}`\n"
-                f"Type: {signal.type}\n"
-                f"Action: **{action}** {qty} lots\n"
-                f"Price (signal): ₹{signal.price:.2f}\n"
-                f"Strike: {strike}\n"
-                f"Strength: {strength:.2f}\n"
-                f"Reason: {signal.reason}\n"
-                f"\n⚠️ **Error**: {str(e)}\n"
-            )
-            logger.error(msg)
-            log_order_result("N/A", symbol, qty, "EXCEPTION", str(e))
-            self.telegram.send_message(msg)
+            log_order_result(ev.order_id, ev.symbol, ev.qty, "PLACED")
+            
+            if ev.pos_key is not None and ev.symbol != self.current_symbol:
+                # Some other position was closed; the strategy's own trade is untouched
+                return
+            if ev.signal_type not in _ENTRY_TYPES:
+                self.current_entry_price = None
+            
+            # Track order for exit logic
+            self.current_order_id = ev.order_id
+            self.current_symbol = ev.symbol
@@ -0,0 +1,23 @@
+"""
+Optional Numba JIT.
+
+`njit` compiles with Numba when it is installed and otherwise returns the
+function unchanged, so numeric kernels written against NumPy arrays run as
+plain Python (e.g. on the Pi, where numba wheels are not always available).
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logger.info("numba not installed, numeric kernels run as plain Python")
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit (bare or with signature/options)"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
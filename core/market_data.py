@@ -3,68 +3,236 @@ Market Data Aggregator - Central hub for real-time price data
 Aggregates data from Shoonya feed and broadcasts to web clients
 """
 import asyncio
-from typing import Dict, Set, Callable
+from typing import Dict, Callable, Optional
 from datetime import datetime
 import logging
+import time
+import zlib
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# numpy scalars/arrays (e.g. from the feed's indicator math) serialize without .item()
+JSON_OPTS = orjson.OPT_SERIALIZE_NUMPY
+
+# Compact keys for WebSocket delta frames (mirrored in frontend websocket.js);
+# fields not listed go out under their full name
+WIRE_KEYS = {
+    'ltp': 'l', 'volume': 'v', 'open': 'o', 'high': 'h', 'low': 'lo',
+    'change': 'c', 'percent_change': 'pc', 'vwap': 'w', 'trend': 't',
+    'macro': 'm', 'ai_signal': 'ai', 'timestamp': 'ts',
+}
+
+_MISSING = object()
+
+# WebSocket frames at least this large are zlib-compressed once and the same
+# bytes are sent to every client (permessage-deflate is disabled server-side)
+COMPRESS_MIN_SIZE = 1024
+
+def compress_frame(frame: bytes) -> bytes:
+    """zlib-compress a large frame; clients detect it by the 0x78 zlib header"""
+    if len(frame) < COMPRESS_MIN_SIZE:
+        return frame
+    return zlib.compress(frame, 1)
+
+# The dashboard counts as active this long after its last read of prices
+UI_IDLE_AFTER = 10.0
+
+# (epoch second, ISO string) for the most recent iso_now() call
+_iso_cache = (0, "")
+
+def iso_now() -> str:
+    """Local time as an ISO string at one-second resolution.
+    
+    Formatted at most once per second and reused by every tick in that
+    second; use time.time() where a float timestamp will do.
+    """
+    global _iso_cache
+    sec = int(time.time())
+    cached_sec, text = _iso_cache
+    if cached_sec != sec:
+        text = datetime.fromtimestamp(sec).isoformat()
+        _iso_cache = (sec, text)
+    return text
+
 class MarketDataAggregator:
-    """Aggregates and broadcasts market data to multiple subscribers"""
+    """Aggregates market data and notifies the web layer's broadcaster"""
     
     def __init__(self):
         self.latest_prices: Dict[str, dict] = {}  # symbol -> price data
-        self.subscribers: Set[Callable] = set()  # WebSocket broadcast callbacks
-        self.lock = asyncio.Lock()
         
+        # Bumped on every write; keys the cached snapshot (version, dict, json bytes)
+        self._version = 0
+        # symbol -> global version of its last write, for per-symbol change detection
+        self.symbol_versions: Dict[str, int] = {}
+        self._snapshot_cache = (-1, {}, None)
+        self._prices_body = (-1, None)
+        self._snapshot_frames: Dict[str, tuple] = {}  # frame type -> (version, bytes)
+        
+        # Web server event loop + broadcaster callback notified on it with each updated symbol
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._on_update: Optional[Callable[[str], None]] = None
+        
+        # Optional Redis client + channel for multi-worker fan-out
+        self._redis = None
+        self._redis_channel: Optional[str] = None
+
+        # Is anyone watching? Open WebSocket clients (kept by the web layer) and
+        # the last time prices were read
+        self._ws_clients = 0
+        self._last_read = 0.0
+
+    @property
+    def ui_active(self) -> bool:
+        """Whether published updates have a consumer: WebSocket clients, a recent
+        price read, or Redis fan-out to other workers. Producers can skip building
+        full payloads while this is False."""
+        return (self._ws_clients > 0 or self._redis is not None
+                or time.monotonic() - self._last_read < UI_IDLE_AFTER)
+
+    def set_ws_clients(self, count: int):
+        """Called by the WebSocket layer whenever its client count changes"""
+        self._ws_clients = count
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop, on_update: Callable[[str], None]):
+        """Bind to the web server's event loop; on_update(symbol) is run on it for every publish"""
+        self._on_update = on_update
+        self._loop = loop
+    
+    def attach_redis(self, url: str, channel: str):
+        """Also publish every update to a Redis channel (multi-worker web server)"""
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._redis_channel = channel
+        logger.info("Publishing price updates to Redis channel '%s'", channel)
+    
+    def publish(self, symbol: str, data: dict):
+        """Store the latest price for a symbol and notify the broadcaster, then
+        forward the update to Redis when attached.
+        
+        Safe to call from any thread (the feed runs on the broker's WebSocket
+        thread): see publish_local.
+        """
+        self.publish_local(symbol, data)
+        if self._redis is not None:
+            try:
+                self._redis.publish(self._redis_channel, orjson.dumps({"symbol": symbol, "data": data}, option=JSON_OPTS))
+            except Exception as e:
+                logger.error("Redis publish failed: %s", e)
+    
+    def store(self, symbol: str, data: dict):
+        """Record the latest data for a symbol without notifying anyone"""
+        self.latest_prices[symbol] = data
+        self._version += 1
+        self.symbol_versions[symbol] = self._version
+    
+    def publish_local(self, symbol: str, data: dict):
+        """Store and broadcast an update in this process only; the broadcaster
+        callback is scheduled onto the attached event loop"""
+        self.store(symbol, data)
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._on_update, symbol)
+    
     async def update_price(self, symbol: str, tick_data: dict):
         """Update price data for a symbol"""
-        async with self.lock:
-            # Store latest tick
-            self.latest_prices[symbol] = {
-                'symbol': symbol,
-                'ltp': float(tick_data.get('lp', 0)),
-                'volume': int(tick_data.get('v', 0)),
-                'open': float(tick_data.get('o', 0)),
-                'high': float(tick_data.get('h', 0)),
-                'low': float(tick_data.get('l', 0)),
-                'change': float(tick_data.get('c', 0)),
-                'timestamp': datetime.now().isoformat()
-            }
-            
-        # Broadcast to all subscribers
-        await self.broadcast(symbol, self.latest_prices[symbol])
+        self.publish(symbol, {
+            'symbol': symbol,
+            'ltp': float(tick_data.get('lp', 0)),
+            'volume': int(tick_data.get('v', 0)),
+            'open': float(tick_data.get('o', 0)),
+            'high': float(tick_data.get('h', 0)),
+            'low': float(tick_data.get('l', 0)),
+            'change': float(tick_data.get('c', 0)),
+            'timestamp': iso_now()
+        })
+    
+    @staticmethod
+    def encode_delta(updates: Dict[str, dict], last_sent: Dict[str, dict]) -> Optional[bytes]:
+        """Serialize only the fields that changed since the last frame, under compact keys.
+        
+        `last_sent` (symbol -> field -> value) is updated in place. A symbol
+        whose only change is its timestamp is left out (periodic reconcile
+        snapshots carry it instead). Returns None when nothing changed.
+        """
+        changes = {}
+        for symbol, data in updates.items():
+            last = last_sent.get(symbol)
+            if last is None:
+                last = last_sent[symbol] = {}
+            changed = [
+                (key, value) for key, value in data.items()
+                if key != 'symbol' and last.get(key, _MISSING) != value
+            ]
+            if not changed or (len(changed) == 1 and changed[0][0] == 'timestamp'):
+                continue
+            delta = {}
+            for key, value in changed:
+                last[key] = value
+                delta[WIRE_KEYS.get(key, key)] = value
+            changes[symbol] = delta
+        if not changes:
+            return None
+        return orjson.dumps({"type": "delta", "u": changes}, option=JSON_OPTS)
     
-    async def broadcast(self, symbol: str, data: dict):
-        """Broadcast price update to all WebSocket clients"""
-        if not self.subscribers:
-            return
-            
-        # Create broadcast tasks
-        tasks = []
-        for callback in self.subscribers:
-            tasks.append(callback(symbol, data))
+    def get_latest_prices(self) -> Dict[str, dict]:
+        """Get all latest prices (for initial load).
         
-        # Execute all broadcasts concurrently
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+        The snapshot is copied once per version and shared between callers
+        until the next publish, so treat it as read-only.
+        """
+        self._last_read = time.monotonic()
+        version, snapshot, _ = self._snapshot_cache
+        if version != self._version:
+            version = self._version
+            snapshot = self.latest_prices.copy()
+            self._snapshot_cache = (version, snapshot, None)
+        return snapshot
     
-    def subscribe(self, callback: Callable):
-        """Subscribe to price updates"""
-        self.subscribers.add(callback)
-        logger.info(f"New subscriber added. Total: {len(self.subscribers)}")
+    def snapshot_json(self) -> bytes:
+        """Latest prices serialized as JSON, re-encoded only when prices change"""
+        snapshot = self.get_latest_prices()
+        version, cached, data = self._snapshot_cache
+        if data is None or cached is not snapshot:
+            data = orjson.dumps(snapshot, option=JSON_OPTS)
+            self._snapshot_cache = (version, snapshot, data)
+        return data
     
-    def unsubscribe(self, callback: Callable):
-        """Unsubscribe from price updates"""
-        self.subscribers.discard(callback)
-        logger.info(f"Subscriber removed. Total: {len(self.subscribers)}")
+    def snapshot_frame(self, frame_type: str = "snapshot") -> bytes:
+        """Full-state WebSocket frame (compressed when large), built once per
+        version and shared by every client that connects (or resyncs) before
+        the next publish"""
+        version = self._version
+        cached = self._snapshot_frames.get(frame_type)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        frame = compress_frame(b'{"type":%b,"data":%b,"timestamp":%b}' % (
+            orjson.dumps(frame_type),
+            self.snapshot_json(),
+            orjson.dumps(time.time())
+        ))
+        self._snapshot_frames[frame_type] = (version, frame)
+        return frame
     
-    def get_latest_prices(self) -> Dict[str, dict]:
-        """Get all latest prices (for initial load)"""
-        return self.latest_prices.copy()
+    def cached_prices_json(self) -> bytes:
+        """Full /api/prices response body, rebuilt once per version.
+        
+        The timestamp is when the body was built, i.e. the first request
+        after the last price change.
+        """
+        version = self._version
+        cached_version, body = self._prices_body
+        if cached_version != version or body is None:
+            body = b'{"prices":%b,"timestamp":%b}' % (
+                self.snapshot_json(),
+                orjson.dumps(time.time())
+            )
+            self._prices_body = (version, body)
+        return body
     
     def get_price(self, symbol: str) -> dict:
         """Get latest price for specific symbol"""
+        self._last_read = time.monotonic()
         return self.latest_prices.get(symbol, {})
 
 # Global instance
@@ -86,10 +86,12 @@ class OrderManager:
     async def close_all_positions(self):
         """Panic Exit / Risk Exit for all products"""
         logger.warning("OMS: CLOSING ALL POSITIONS")
-        for (symbol, product), pos in self.position_mgr.positions.items():
+        # Snapshot first: fills may update positions while exits are in flight
+        for (symbol, product), pos in list(self.position_mgr.positions.items()):
             if pos["net_qty"] != 0:
                 side = "SELL" if pos["net_qty"] > 0 else "BUY"
                 qty = abs(pos["net_qty"])
                 logger.warning(f"OMS: Exiting {symbol} ({product}) Qty: {qty}")
-                self.place_order(symbol, side, qty, product_type=product, tag="PANIC_EXIT")
+                # Broker REST call; keep it off the caller's event loop
+                await asyncio.to_thread(self.place_order, symbol, side, qty, product_type=product, tag="PANIC_EXIT")
                 
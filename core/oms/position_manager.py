@@ -97,6 +97,14 @@ class PositionManager:
                 
         return total_unrealized
 
+    def serialize_positions(self, market_prices: Dict[str, dict]) -> Dict[str, dict]:
+        """JSON-ready copy of all positions keyed "SYMBOL:PRODUCT", each with its current LTP"""
+        get_price = market_prices.get
+        return {
+            f"{symbol}:{product}": {**pos, 'ltp': (get_price(symbol) or {}).get('ltp', pos["avg_price"])}
+            for (symbol, product), pos in self.positions.items()
+        }
+
     def _manage_tsl(self, pos: Dict, ltp: float):
         """
         Internal TSL logic: Activate at 5% profit, then trail by 5%.
@@ -1,7 +1,13 @@
 """
 Order logger - separate logging for all order events
+
+Records are handed to a QueueListener thread that does the file writes, so
+callers on the tick/order threads never wait on disk I/O.
 """
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from datetime import datetime
 
@@ -20,7 +26,13 @@ order_handler.setLevel(logging.INFO)
 order_formatter = logging.Formatter('%(asctime)s | %(message)s')
 order_handler.setFormatter(order_formatter)
 
-order_logger.addHandler(order_handler)
+# Writes happen on the listener's thread; stop() at exit drains what is still queued
+_order_queue = queue.SimpleQueue()
+order_listener = QueueListener(_order_queue, order_handler, respect_handler_level=True)
+order_listener.start()
+atexit.register(order_listener.stop)
+
+order_logger.addHandler(QueueHandler(_order_queue))
 
 # Don't propagate to root logger
 order_logger.propagate = False
@@ -2,11 +2,13 @@
 Paper Trading Module - Track simulated trades without real broker integration
 """
 import json
+from collections import deque
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterator
 from dataclasses import dataclass, asdict
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -30,8 +32,25 @@ class PaperTradingEngine:
     def __init__(self):
         self.current_position: Optional[PaperTrade] = None
         self.closed_trades: List[PaperTrade] = []
-        self.trades_file = Path("logs/paper_trades.json")
+        # One JSON object per line, appended as trades close
+        self.trades_file = Path("logs/paper_trades.jsonl")
         self.trades_file.parent.mkdir(exist_ok=True)
+        self._migrate_legacy_file(Path("logs/paper_trades.json"))
+    
+    def _migrate_legacy_file(self, legacy_file: Path):
+        """Convert the old single-array JSON history to JSONL (once)"""
+        if not legacy_file.exists() or self.trades_file.exists():
+            return
+        try:
+            with open(legacy_file, 'r') as f:
+                trades = json.load(f)
+            with open(self.trades_file, 'wb') as f:
+                for trade in trades:
+                    f.write(orjson.dumps(trade) + b"\n")
+            legacy_file.rename(legacy_file.with_suffix(".json.bak"))
+            logger.info(f"Migrated {len(trades)} paper trades to {self.trades_file}")
+        except Exception as e:
+            logger.error(f"Paper trade history migration failed: {e}")
         
     def enter_position(self, signal_type: str, entry_price: float, strike: int, 
                        quantity: int, reason: str) -> PaperTrade:
@@ -85,19 +104,27 @@ class PaperTradingEngine:
         return pnl
     
     def _save_trade(self, trade: PaperTrade):
-        """Save trade to JSON file"""
-        trades = []
-        if self.trades_file.exists():
-            with open(self.trades_file, 'r') as f:
-                try:
-                    trades = json.load(f)
-                except:
-                    trades = []
-        
-        trades.append(asdict(trade))
-        
-        with open(self.trades_file, 'w') as f:
-            json.dump(trades, f, indent=2)
+        """Append trade to the JSONL history"""
+        with open(self.trades_file, 'ab') as f:
+            f.write(orjson.dumps(asdict(trade)) + b"\n")
+    
+    def _iter_trades(self, lines) -> Iterator[Dict]:
+        """Decode JSONL lines, skipping blank or corrupt ones"""
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+    
+    def recent_trades(self, limit: int = 50) -> List[Dict]:
+        """Last `limit` trades, oldest first, without parsing the whole history"""
+        if not self.trades_file.exists():
+            return []
+        with open(self.trades_file, 'rb') as f:
+            tail = deque(f, maxlen=limit)
+        return list(self._iter_trades(tail))
     
     def get_daily_pnl(self) -> Dict:
         """Calculate today's paper trading P&L"""
@@ -114,17 +141,12 @@ class PaperTradingEngine:
                 "trades": []
             }
         
-        with open(self.trades_file, 'r') as f:
-            try:
-                all_trades = json.load(f)
-            except:
-                all_trades = []
-        
-        # Filter today's closed trades
-        today_trades = [
-            t for t in all_trades 
-            if t.get('exit_time') and t['exit_time'].startswith(today)
-        ]
+        # Filter today's closed trades while streaming the file
+        with open(self.trades_file, 'rb') as f:
+            today_trades = [
+                t for t in self._iter_trades(f)
+                if t.get('exit_time') and t['exit_time'].startswith(today)
+            ]
         
         total_trades = len(today_trades)
         winning_trades = len([t for t in today_trades if t.get('pnl', 0) > 0])
@@ -0,0 +1,52 @@
+"""
+Bounded hand-off queues for background workers.
+
+`RingQueue` never blocks or fails the producer: when full, the oldest item
+is discarded to make room, so a stalled consumer (Telegram, broker) leaves
+the most recent items waiting rather than the oldest.
+"""
+import logging
+import queue
+import threading
+from collections import deque
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class RingQueue:
+    """Thread-safe FIFO of at most `maxsize` items that drops the oldest on overflow"""
+
+    def __init__(self, maxsize: int, name: str = "queue"):
+        self.maxsize = maxsize
+        self.name = name
+        self.dropped = 0  # items discarded to make room, since creation
+        self._dq = deque()
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def put(self, item: Any):
+        """Append an item, discarding the oldest one if the queue is full"""
+        with self._not_empty:
+            dropped = len(self._dq) >= self.maxsize
+            if dropped:
+                self._dq.popleft()
+                self.dropped += 1
+            self._dq.append(item)
+            self._not_empty.notify()
+        if dropped and self.dropped % 1000 == 1:
+            logger.warning("%s full, dropped %d oldest items so far", self.name, self.dropped)
+
+    put_nowait = put
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Remove and return the oldest item, waiting up to `timeout` seconds
+        (forever when None); raises queue.Empty on timeout"""
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._dq, timeout):
+                raise queue.Empty
+            return self._dq.popleft()
+
+    def get_nowait(self) -> Any:
+        return self.get(timeout=0)
+
+    def qsize(self) -> int:
+        return len(self._dq)
@@ -1,9 +1,12 @@
+import numpy as np
 import pandas as pd
 import logging
 from typing import Dict, Optional, List
 from dataclasses import dataclass
 from datetime import datetime
 
+from core.jit import njit
+
 logger = logging.getLogger(__name__)
 
 # Bank Nifty Constituents with approximate weights (as of 2024)
@@ -61,28 +64,56 @@ class WeightageCalculator:
         """
         self.weights = weights or BANKNIFTY_WEIGHTS
         self.use_volume = use_volume
-        self.open_prices: Dict[str, float] = {}
-        self.current_prices: Dict[str, float] = {}
-        self.current_volumes: Dict[str, float] = {}
-        self.initial_volumes: Dict[str, float] = {} # Volume at start of day/session
+        
+        # One slot per constituent (struct-of-arrays); None = not seen yet
+        self._idx: Dict[str, int] = {symbol: i for i, symbol in enumerate(self.weights)}
+        n = len(self._idx)
+        self._w: List[float] = list(self.weights.values())
+        self._open: List[Optional[float]] = [None] * n
+        self._cur: List[Optional[float]] = [None] * n
+        self._vol: List[float] = [0] * n
+        self._initial_vol: List[float] = [0] * n # Volume at start of day/session
+        
+        # Each symbol's weighted % change, refreshed only when its prices change;
+        # the strength is their sum, cached until the next update
+        self._contrib: List[float] = [0.0] * n
+        self._strength: Optional[float] = 0.0
         
     def set_open_price(self, symbol: str, price: float):
         """Manually set the open price (e.g., from history)"""
-        if symbol in self.weights:
-            self.open_prices[symbol] = price
+        i = self._idx.get(symbol)
+        if i is not None:
+            self._open[i] = price
+            self._refresh(i)
             logger.info(f"📊 Weightage: Set OPEN for {symbol} to {price:.2f}")
 
     def update_data(self, symbol: str, price: float, volume: float = 0, is_open: bool = False):
         """Update price and volume for a symbol."""
-        if symbol not in self.weights:
+        i = self._idx.get(symbol)
+        if i is None:
             return
             
-        self.current_prices[symbol] = price
-        self.current_volumes[symbol] = volume
+        self._cur[i] = price
+        self._vol[i] = volume
         
-        if is_open or symbol not in self.open_prices:
-            self.open_prices[symbol] = price
-            self.initial_volumes[symbol] = volume
+        if is_open or self._open[i] is None:
+            self._open[i] = price
+            self._initial_vol[i] = volume
+        self._refresh(i)
+    
+    def _refresh(self, i: int):
+        op, cur = self._open[i], self._cur[i]
+        if op and cur is not None:
+            pct_change = (cur - op) / op * 100
+            
+            # Experimental: Volume Weighting
+            # If enabled, boost contribution if volume is significant
+            # (Placeholder: real implementation needs Relative Volume (RVOL),
+            #  and we lack historical avg volume)
+            self._contrib[i] = pct_change * self._w[i]
+        else:
+            self._contrib[i] = 0.0
+        self._strength = None
     
     def calculate_weighted_strength(self) -> float:
         """
@@ -90,31 +121,36 @@ class WeightageCalculator:
         Returns a value representing the weighted % change sum.
         Positive = Bullish, Negative = Bearish.
         """
-        total_strength = 0.0
-        
-        for symbol in self.weights.keys():
-            if symbol not in self.open_prices or symbol not in self.current_prices:
-                continue
-            if self.open_prices[symbol] == 0:
-                continue
-                
-            pct_change = (self.current_prices[symbol] - self.open_prices[symbol]) / self.open_prices[symbol] * 100
-            weight = self.weights.get(symbol, 0)
-            
-            contribution = pct_change * weight
-            
-            # Experimental: Volume Weighting
-            # If enabled, boost contribution if volume is significant
-            # (Simple implementation: Multiply by log of volume relative to others? 
-            #  For now, just a placeholder for the logic as we lack historical avg volume)
-            if self.use_volume and symbol in self.current_volumes:
-                # This is a placeholder for volume logic
-                # Real implementation needs Relative Volume (RVOL)
-                pass
-                
-            total_strength += contribution
-            
-        return total_strength
+        if self._strength is None:
+            self._strength = sum(self._contrib)
+        return self._strength
+
+@njit('UniTuple(f8, 2)(f8[:], i8, i8)', cache=True)
+def _macro_trend_nb(close, sma_period, rsi_period):
+    """
+    Latest SMA and RSI of a close series, with the same definitions as the
+    pandas path: SMA over the last `sma_period` closes, RSI from the plain
+    mean gain/loss of the last `rsi_period` deltas.
+    """
+    n = close.shape[0]
+    total = 0.0
+    for i in range(n - sma_period, n):
+        total += close[i]
+    sma = total / sma_period
+
+    gain = 0.0
+    loss = 0.0
+    for i in range(n - rsi_period, n):
+        d = close[i] - close[i - 1]
+        if d > 0:
+            gain += d
+        else:
+            loss -= d
+    if loss == 0.0:
+        rsi = 100.0 if gain > 0.0 else np.nan
+    else:
+        rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+    return sma, rsi
 
 class TechnicalIndicators:
     """Helper for technical analysis."""
@@ -134,19 +170,19 @@ class TechnicalIndicators:
         Calculate macro trend from hourly data.
         Returns: {'trend': 'BULLISH'|'BEARISH', 'rsi': float, 'message': str}
         """
-        if history_df.empty or len(history_df) < 50:
+        if history_df.empty:
             return {'trend': 'NEUTRAL', 'rsi': 0, 'message': 'Insufficient Data'}
-            
-        # Ensure numeric
-        close = pd.to_numeric(history_df['close'])
-        
-        # 1. 50-Period SMA
-        sma_50 = close.rolling(window=50).mean().iloc[-1]
-        current_price = close.iloc[-1]
-        
-        # 2. RSI 14
-        rsi_series = TechnicalIndicators.calculate_rsi(close, 14)
-        rsi = rsi_series.iloc[-1]
+        return TechnicalIndicators.macro_trend(pd.to_numeric(history_df['close']).to_numpy(dtype=np.float64))
+
+    @staticmethod
+    def macro_trend(close: np.ndarray) -> Dict[str, any]:
+        """calculate_macro_trend on a float64 array of closes, oldest first"""
+        if len(close) < 50:
+            return {'trend': 'NEUTRAL', 'rsi': 0, 'message': 'Insufficient Data'}
+
+        # 1. 50-Period SMA, 2. RSI 14
+        sma_50, rsi = _macro_trend_nb(np.ascontiguousarray(close, dtype=np.float64), 50, 14)
+        current_price = close[-1]
         
         # Determine Trend
         trend = "NEUTRAL"
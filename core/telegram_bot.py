@@ -1,24 +1,31 @@
 import requests
 import logging
-import os
 from typing import Optional
 
+from core import config
+
 logger = logging.getLogger(__name__)
 
 class TelegramBot:
     def __init__(self):
-        # Try MAA_ prefix first (user's convention), then fall back to standard names
-        self.token = os.getenv("MAA_TELEGRAM_BOT_TOKEN") or os.getenv("TELEGRAM_BOT_TOKEN")
-        self.chat_id = os.getenv("MAA_TELEGRAM_CHAT_ID") or os.getenv("TELEGRAM_CHAT_ID")
+        # Resolved once in core.config (MAA_ prefix first, then the standard names)
+        self.token = config.TELEGRAM_BOT_TOKEN
+        self.chat_id = config.TELEGRAM_CHAT_ID
         self.base_url = f"https://api.telegram.org/bot{self.token}"
+        # One keep-alive connection to api.telegram.org, reused across messages
+        self.session = requests.Session()
         
         if not self.token or not self.chat_id:
             logger.warning("⚠️ Telegram credentials not found. Alerts will be disabled.")
 
+    @property
+    def enabled(self) -> bool:
+        """Whether send_message would actually send (mode on and credentials set)"""
+        return bool(config.TELEGRAM_MODE and self.token and self.chat_id)
+
     def send_message(self, message: str) -> bool:
         """Send a text message to the configured chat ID."""
-        from core.config import TELEGRAM_MODE
-        if not TELEGRAM_MODE:
+        if not config.TELEGRAM_MODE:
             logger.info("ℹ️ Telegram Message suppressed (TELEGRAM_MODE=OFF)")
             return True # Not an error, just suppressed
 
@@ -36,7 +43,7 @@ class TelegramBot:
                 "text": clean_msg,
                 # No parse_mode - send as plain text to avoid parsing errors
             }
-            response = requests.post(url, json=payload, timeout=10)
+            response = self.session.post(url, json=payload, timeout=10)
             response.raise_for_status()
             return True
         except requests.exceptions.HTTPError as e:
@@ -0,0 +1,84 @@
+import threading
+
+import numpy as np
+from typing import Dict, Tuple
+
+from core.jit import njit
+
+# Columns of the per-symbol state rows
+_CUM_VOL, _CUM_PV, _LAST_VOL = range(3)
+
+@njit('f8(f8[:, :],i8,f8,f8)', cache=True)
+def _vwap_update(state, idx, price, cur_vol):
+    """
+    Fold one tick into row `idx`. `cur_vol` is the broker's cumulative day
+    volume, so only the increase since the last tick is traded volume.
+    Returns the running VWAP, or NaN while the symbol has no volume.
+    """
+    delta = cur_vol - state[idx, _LAST_VOL]
+    if cur_vol > 0 and delta > 0:
+        state[idx, _CUM_VOL] += delta
+        state[idx, _CUM_PV] += price * delta
+        state[idx, _LAST_VOL] = cur_vol
+    if state[idx, _CUM_VOL] > 0:
+        return state[idx, _CUM_PV] / state[idx, _CUM_VOL]
+    return np.nan
+
+class VwapBook:
+    """
+    Intraday VWAP state for every symbol: one contiguous (N, 3) float64 array
+    with a row per symbol (cumulative volume, cumulative price*volume, last
+    cumulative day volume seen), indexed by a per-symbol integer id. Ids are
+    handed out on first use (from any thread, e.g. ATM lookups) and the array
+    grows by doubling. Growth copies the rows into a new array, so it and every
+    read/write of the rows hold the book's lock: an update can never land in
+    the old array after it was copied. Volumes are exact in float64 up to 2**53.
+    """
+    def __init__(self, capacity: int = 64):
+        self.sym_idx: Dict[str, int] = {}
+        self._state = np.zeros((capacity, 3), dtype=np.float64)
+        self._lock = threading.Lock()
+
+    def index(self, symbol: str) -> int:
+        idx = self.sym_idx.get(symbol)
+        if idx is None:
+            with self._lock:
+                idx = self.sym_idx.get(symbol)
+                if idx is None:
+                    idx = len(self.sym_idx)
+                    if idx == len(self._state):
+                        grown = np.zeros((2 * len(self._state), 3), dtype=np.float64)
+                        grown[:idx] = self._state
+                        self._state = grown
+                    self.sym_idx[symbol] = idx
+        return idx
+
+    def update(self, symbol: str, price: float, cur_vol: int) -> float:
+        """Apply a tick; returns the VWAP (NaN until the symbol has traded volume)"""
+        return self.update_at(self.index(symbol), price, cur_vol)
+
+    def update_at(self, idx: int, price: float, cur_vol: int) -> float:
+        """update() for a caller that already holds the symbol's id from index()"""
+        with self._lock:
+            return _vwap_update(self._state, idx, price, cur_vol)
+
+    def seed(self, symbol: str, cum_vol: int, cum_pv: float, last_vol: int):
+        """Start the day from historical candles"""
+        idx = self.index(symbol)
+        with self._lock:
+            row = self._state[idx]
+            row[_LAST_VOL] = last_vol
+            if cum_vol > 0:
+                row[_CUM_VOL] = cum_vol
+                row[_CUM_PV] = cum_pv
+
+    def get(self, symbol: str) -> Tuple[int, float]:
+        """(cum_vol, vwap) for a symbol; vwap is NaN without volume"""
+        idx = self.sym_idx.get(symbol)
+        if idx is None:
+            return 0, float('nan')
+        with self._lock:
+            cum_vol, cum_pv, _ = self._state[idx]
+        if cum_vol == 0:
+            return 0, float('nan')
+        return int(cum_vol), float(cum_pv / cum_vol)
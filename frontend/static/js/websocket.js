@@ -3,6 +3,13 @@
  * Ultra-low latency connection with auto-reconnect
  */
 
+// Compact delta keys -> full field names (mirrors WIRE_KEYS in core/market_data.py)
+const WIRE_FIELDS = {
+    l: 'ltp', v: 'volume', o: 'open', h: 'high', lo: 'low',
+    c: 'change', pc: 'percent_change', w: 'vwap', t: 'trend',
+    m: 'macro', ai: 'ai_signal', ts: 'timestamp'
+};
+
 class PriceWebSocket {
     constructor(url) {
         this.url = url;
@@ -13,6 +20,13 @@ class PriceWebSocket {
         this.reconnectDelay = 1000; // Start with 1 second
         this.pingInterval = null;
         this.lastPingTime = 0;
+        this.decoder = new TextDecoder();
+
+        // Frames are handled strictly in arrival order, even while one is being inflated
+        this.inbox = Promise.resolve();
+
+        // Rolling per-symbol state that deltas are merged into
+        this.prices = {};
 
         // Callbacks
         this.onSnapshot = null;
@@ -25,6 +39,8 @@ class PriceWebSocket {
     connect() {
         try {
             this.ws = new WebSocket(this.url);
+            // Server sends pre-serialized JSON as binary frames
+            this.ws.binaryType = 'arraybuffer';
 
             this.ws.onopen = () => {
                 console.log('WebSocket connected');
@@ -41,7 +57,10 @@ class PriceWebSocket {
             };
 
             this.ws.onmessage = (event) => {
-                this.handleMessage(event.data);
+                this.inbox = this.inbox
+                    .then(() => this.inflate(event.data))
+                    .then((data) => this.handleMessage(data))
+                    .catch((error) => console.error('Error decoding message:', error));
             };
 
             this.ws.onerror = (error) => {
@@ -67,8 +86,21 @@ class PriceWebSocket {
         }
     }
 
+    async inflate(data) {
+        // Large frames arrive zlib-compressed (first byte 0x78); JSON starts with '{'
+        if (data instanceof ArrayBuffer && new Uint8Array(data, 0, 1)[0] === 0x78) {
+            const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream('deflate'));
+            return new Response(stream).arrayBuffer();
+        }
+        return data;
+    }
+
     handleMessage(data) {
         try {
+            if (data instanceof ArrayBuffer) {
+                data = this.decoder.decode(data);
+            }
+
             // Handle pong for latency
             if (data === 'pong') {
                 const latency = Date.now() - this.lastPingTime;
@@ -82,16 +114,37 @@ class PriceWebSocket {
 
             switch (message.type) {
                 case 'snapshot':
-                    // Initial data load
+                    // Initial data load (also sent to resync after a backlog)
+                    this.prices = {};
+                    for (const [symbol, data] of Object.entries(message.data)) {
+                        this.prices[symbol] = { ...data };
+                    }
                     if (this.onSnapshot) {
                         this.onSnapshot(message.data);
                     }
                     break;
 
-                case 'price_update':
-                    // Real-time price update
-                    if (this.onPriceUpdate) {
-                        this.onPriceUpdate(message.symbol, message.data);
+                case 'reconcile':
+                    // Periodic full state: replace local state, refresh rows in place
+                    this.prices = {};
+                    for (const [symbol, data] of Object.entries(message.data)) {
+                        this.prices[symbol] = { ...data };
+                        if (this.onPriceUpdate) {
+                            this.onPriceUpdate(symbol, this.prices[symbol]);
+                        }
+                    }
+                    break;
+
+                case 'delta':
+                    // Changed fields only, under compact keys
+                    for (const [symbol, fields] of Object.entries(message.u)) {
+                        const state = this.prices[symbol] || (this.prices[symbol] = { symbol });
+                        for (const [key, value] of Object.entries(fields)) {
+                            state[WIRE_FIELDS[key] || key] = value;
+                        }
+                        if (this.onPriceUpdate) {
+                            this.onPriceUpdate(symbol, state);
+                        }
                     }
                     break;
 
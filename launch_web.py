@@ -37,6 +37,20 @@ def main():
     logger.info("📊 Real-time data from Shoonya")
     logger.info("=" * 60)
     
+    from core import config
+    from core.market_data import market_data
+    
+    # Multi-worker mode: this process runs the bot and publishes ticks to Redis;
+    # each uvicorn worker subscribes and serves its own WebSocket clients
+    fanout = bool(config.REDIS_URL) and config.API_WORKERS > 1
+    if fanout:
+        market_data.attach_redis(config.REDIS_URL, config.REDIS_TICKS_CHANNEL)
+    
+    # Schema upgrades may rebuild the database file: run them before the bot
+    # and any API worker process open it
+    from core.database import db
+    db.migrate()
+    
     # Start trading bot in background thread
     bot_thread = threading.Thread(target=run_trading_bot, daemon=True, name="TradingBot")
     bot_thread.start()
@@ -53,17 +67,50 @@ def main():
     except Exception as e:
         logger.warning(f"Could not open browser: {e}")
 
-    # Import and run web server
-    from api.main import app
-    
     logger.info("Starting FastAPI web server...")
+    if fanout:
+        # Workers are separate processes: they stream prices, but engine-backed
+        # endpoints (orders, positions) report the engine as not ready and
+        # state-changing ones (mode, auto-trade, orders) answer 503
+        logger.info(f"Running {config.API_WORKERS} API workers with Redis fan-out")
+        app = "api.main:app"
+        workers = {"workers": config.API_WORKERS}
+    else:
+        from api.main import app
+        workers = {}
+    
     uvicorn.run(
         app,
         host="0.0.0.0",
         port=8000,
-        log_level="info"
+        log_level="info",
+        **workers,
+        **_server_impl()
     )
 
+def _server_impl() -> dict:
+    """Prefer the C-accelerated uvloop/httptools stack, fall back to pure asyncio"""
+    impl = {
+        "ws": "websockets",
+        # The app runs its own ping/pong keepalive; skip the protocol-level one
+        "ws_ping_interval": None,
+        # Clients only ever send short "ping" text frames
+        "ws_max_size": 64 * 1024,
+        # Large frames are compressed once by the app, not per client
+        "ws_per_message_deflate": False,
+    }
+    try:
+        import uvloop  # noqa: F401
+        impl["loop"] = "uvloop"
+    except ImportError:
+        logger.warning("uvloop not installed, using default asyncio loop")
+    try:
+        import httptools  # noqa: F401
+        impl["http"] = "httptools"
+    except ImportError:
+        logger.warning("httptools not installed, using h11")
+    return impl
+
 if __name__ == "__main__":
     try:
         main()
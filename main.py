@@ -46,6 +46,10 @@ def main():
     
     telegram.send_message(startup_msg)
     
+    # No-op when launch_web.py already migrated the database
+    from core.database import db
+    db.migrate()
+    
     global active_engine
     active_engine = TickEngine()
     engine = active_engine
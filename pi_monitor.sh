@@ -153,7 +153,7 @@ download_logs() {
         neerajsharma@192.168.0.54:$REMOTE_DIR/logs/*.log \
         ./pi_logs/ 2>/dev/null
     scp -i ~/.ssh/id_ed25519_raspi -P 2222 \
-        neerajsharma@192.168.0.54:$REMOTE_DIR/logs/*.json \
+        neerajsharma@192.168.0.54:$REMOTE_DIR/logs/*.json* \
         ./pi_logs/ 2>/dev/null
     echo -e "${GREEN}✅ Logs downloaded to ./pi_logs/${NC}"
     ls -lh ./pi_logs/
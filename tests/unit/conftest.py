@@ -0,0 +1,9 @@
+import pytest
+
+from core import database
+
+@pytest.fixture(autouse=True, scope="session")
+def _scratch_default_db(tmp_path_factory):
+    """Code that uses the shared `database.db` gets a scratch file, never the
+    committed data/trading_state.db"""
+    database.DB_PATH = str(tmp_path_factory.mktemp("data") / "trading_state.db")
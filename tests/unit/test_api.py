@@ -0,0 +1,34 @@
+import asyncio
+
+import orjson
+
+from api import main
+from core.market_data import MarketDataAggregator
+
+def test_delta_after_snapshot_resends_reverted_value(monkeypatch):
+    md = MarketDataAggregator()
+    monkeypatch.setattr(main, "market_data", md)
+    monkeypatch.setattr(main, "_last_sent_versions", {})
+    monkeypatch.setattr(main, "_last_sent_fields", {})
+    conn = main._Connection(None, asyncio.Queue())
+    main.active_connections[id(conn)] = conn
+
+    def tick(ltp):
+        md.store("SBIN", {"symbol": "SBIN", "ltp": ltp, "timestamp": "09:15:00"})
+        main._pending_symbols.add("SBIN")
+        main._flush_ticks()
+
+    try:
+        tick(100.0)
+        assert orjson.loads(conn.queue.get_nowait())["u"] == {"SBIN": {"l": 100.0, "ts": "09:15:00"}}
+
+        # 101 is stored but not flushed yet when a client connects: its snapshot has 101
+        md.store("SBIN", {"symbol": "SBIN", "ltp": 101.0, "timestamp": "09:15:00"})
+        snapshot = orjson.loads(main._snapshot_frame())
+        assert snapshot["data"]["SBIN"]["ltp"] == 101.0
+
+        # Back to 100: the delta must carry it even though 100 was sent before
+        tick(100.0)
+        assert orjson.loads(conn.queue.get_nowait())["u"]["SBIN"]["l"] == 100.0
+    finally:
+        main.active_connections.pop(id(conn), None)
@@ -0,0 +1,103 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from core.candles import CandleResampler
+
+IST = ZoneInfo('Asia/Kolkata')
+
+def _ts(h, m, s=0):
+    return datetime(2025, 1, 6, h, m, s, tzinfo=IST)
+
+def test_resampler_rolls_over_and_builds_history():
+    r = CandleResampler(interval_minutes=5)
+    assert r.process_tick(100.0, 10, _ts(10, 0, 5)) is None
+    r.process_tick(105.0, 5, _ts(10, 2))
+    r.process_tick(98.0, 5, _ts(10, 4, 59))
+
+    done = r.process_tick(101.0, 1, _ts(10, 5, 1))
+    assert done.complete
+    assert done.timestamp == _ts(10, 0)
+    assert (done.open, done.high, done.low, done.close, done.volume) == (100.0, 105.0, 98.0, 98.0, 20)
+
+    latest = r.get_latest_candle()
+    assert latest.timestamp == _ts(10, 5) and not latest.complete
+
+    df = r.get_history()
+    assert list(df.columns) == ["open", "high", "low", "close", "volume"]
+    assert df.index[0] == _ts(10, 0)
+    assert df.iloc[0]["volume"] == 20
+
+def test_resampler_ring_keeps_latest_bars_in_order():
+    r = CandleResampler(interval_minutes=1, capacity=3)
+    for m in range(6):
+        r.process_tick(float(m), 1, _ts(10, m))
+
+    df = r.get_history()
+    assert len(df) == 3
+    assert list(df["open"]) == [2.0, 3.0, 4.0]
+    assert df.index[-1] == _ts(10, 4)
+
+def test_resampler_accepts_epoch_ns():
+    r = CandleResampler(interval_minutes=3, tz=IST)
+    ns = lambda dt: int(dt.timestamp()) * 1_000_000_000
+    r.process_tick(100.0, 1, ns(_ts(10, 1)))
+    r.process_tick(102.0, 1, ns(_ts(10, 2, 30)))
+
+    done = r.process_tick(101.0, 1, ns(_ts(10, 3)))
+    assert done.timestamp == _ts(10, 0)
+    assert (done.high, done.volume) == (102.0, 2)
+    assert r.get_history().index[0] == _ts(10, 0)
+
+def test_resampler_accepts_numpy_epoch_ns():
+    import numpy as np
+    r = CandleResampler(interval_minutes=3, tz=IST)
+    ns = lambda dt: np.int64(int(dt.timestamp()) * 1_000_000_000)
+    r.process_tick(100.0, 1, ns(_ts(10, 1)))
+    done = r.process_tick(101.0, 1, ns(_ts(10, 3)))
+    assert done.timestamp == _ts(10, 0)
+    assert (done.close, done.volume) == (100.0, 1)
+
+def test_process_ticks_matches_per_tick():
+    import numpy as np
+    ts = np.array([int(_ts(10, m, s).timestamp()) * 1_000_000_000
+                   for m in range(0, 12, 2) for s in (0, 30)], dtype='i8')
+    prices = np.linspace(100.0, 111.0, len(ts))
+    volumes = np.arange(1, len(ts) + 1)
+
+    one = CandleResampler(interval_minutes=3, tz=IST)
+    for t, p, v in zip(ts, prices, volumes):
+        one.process_tick(float(p), int(v), int(t))
+
+    bulk = CandleResampler(interval_minutes=3, tz=IST)
+    assert bulk.process_ticks(ts[:5], prices[:5], volumes[:5]) + \
+        bulk.process_ticks(ts[5:], prices[5:], volumes[5:]) == len(one.get_history())
+
+    assert bulk.get_history().equals(one.get_history())
+    assert bulk.get_latest_candle() == one.get_latest_candle()
+
+def test_latest_n_reads_tail_of_ring():
+    r = CandleResampler(interval_minutes=1, capacity=4)
+    for m in range(7):
+        r.process_tick(float(m), 1, _ts(10, m))
+
+    assert r.head == 6
+    tail = r.latest_n(2)
+    assert list(tail["open"]) == [4.0, 5.0]
+    assert tail.index[-1] == _ts(10, 5)
+    assert len(r.latest_n(10)) == 4
+
+def test_multi_resampler_matches_separate_resamplers():
+    from core.candles import MultiResampler
+    ns = lambda dt: int(dt.timestamp()) * 1_000_000_000
+    ticks = [(100.0 + (m * 7 + s) % 11, 1, ns(_ts(10, m, s))) for m in range(16) for s in (0, 20, 40)]
+
+    multi = MultiResampler((3, 5), tz=IST)
+    three = CandleResampler(interval_minutes=3, tz=IST)
+    five = CandleResampler(interval_minutes=5, tz=IST)
+    for price, vol, ts in ticks:
+        assert multi.process_tick(price, vol, ts) == (three.process_tick(price, vol, ts),
+                                                       five.process_tick(price, vol, ts))
+
+    assert multi[0].get_history().equals(three.get_history())
+    assert multi[1].get_history().equals(five.get_history())
+    assert multi[1].get_latest_candle() == five.get_latest_candle()
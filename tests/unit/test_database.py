@@ -10,7 +10,8 @@ def test_db():
         os.remove(db_file)
     db = TradingDatabase(db_path=db_file)
     yield db
-    # Cleanup after tests
+    # Cleanup after tests (closing checkpoints and removes the WAL files)
+    db.close()
     if os.path.exists(db_file):
         os.remove(db_file)
 
@@ -52,3 +53,102 @@ def test_db_app_state(test_db):
     test_db.save_state("test_key", "test_value")
     val = test_db.get_state("test_key")
     assert val == "test_value"
+
+def test_db_buffered_position_keeps_latest(test_db):
+    test_db.save_position("SBIN", {"net_qty": 10, "avg_price": 600.0})
+    test_db.save_position("SBIN", {"net_qty": 0, "avg_price": 0.0, "realized_pnl": 25.0})
+
+    positions = test_db.get_positions()
+    assert positions[("SBIN", "I")]["net_qty"] == 0
+    assert positions[("SBIN", "I")]["realized_pnl"] == 25.0
+
+def test_db_migrates_legacy_orders(tmp_path):
+    import json
+    import sqlite3
+    db_file = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE orders (id TEXT PRIMARY KEY, symbol TEXT, side TEXT, qty INTEGER, "
+                 "price REAL, status TEXT, timestamp TEXT, raw_data TEXT)")
+    order = {"id": "O1", "symbol": "SBIN", "side": "BUY", "qty": 1, "price": 600.0,
+             "status": "REJECTED", "reason": "margin", "timestamp": "2026-01-01T12:00:00.250000"}
+    conn.execute("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                 (*[order[k] for k in ("id", "symbol", "side", "qty", "price", "status", "timestamp")], json.dumps(order)))
+    conn.commit()
+    conn.close()
+
+    db = TradingDatabase(db_path=str(db_file))
+    try:
+        # Opening does not rewrite the file; migrate() does
+        assert db._conn.execute("PRAGMA user_version").fetchone()[0] == 0
+        db.migrate()
+        assert db.get_orders_by_date("2026-01-01") == [order]
+    finally:
+        db.close()
+
+def test_db_migrates_malformed_legacy_orders(tmp_path):
+    import sqlite3
+    from datetime import datetime
+    db_file = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE orders (id TEXT PRIMARY KEY, symbol TEXT, side TEXT, qty INTEGER, "
+                 "price REAL, status TEXT, timestamp TEXT, raw_data TEXT)")
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+        ("O1", "SBIN", "BUY", 1, 600.0, "COMPLETE", None, None),       # NULL timestamp and raw_data
+        ("O2", "SBIN", "SELL", 1, 601.0, "COMPLETE", "garbage", "{not json"),
+        ("O3", "SBIN", "BUY", 1, 602.0, "REJECTED", "2026-01-01T09:15:00", '["a list"]'),
+    ])
+    conn.commit()
+    conn.close()
+
+    db = TradingDatabase(db_path=str(db_file))
+    try:
+        db.migrate()
+        today = {o["id"]: o for o in db.get_orders_by_date(datetime.now().strftime("%Y-%m-%d"))}
+        assert set(today) == {"O1", "O2"}  # unreadable timestamps fall back to migration time
+        assert today["O1"]["reason"] is None and today["O2"]["reason"] is None
+        [o3] = db.get_orders_by_date("2026-01-01")
+        assert o3["id"] == "O3" and o3["reason"] is None
+    finally:
+        db.close()
+
+def test_db_cached_reads_follow_writes(test_db):
+    assert test_db.get_state("realized_pnl", 0.0) == 0.0
+    test_db.save_state("realized_pnl", 12.5)
+    assert test_db.get_state("realized_pnl") == "12.5"
+
+    assert test_db.get_positions() == {}
+    test_db.save_position("SBIN", {"net_qty": 5, "avg_price": 600.0}, product="M")
+    positions = test_db.get_positions()
+    positions[("SBIN", "M")]["net_qty"] = 99  # callers get their own copy
+    assert test_db.get_positions()[("SBIN", "M")]["net_qty"] == 5
+
+    test_db.reload_from_db()
+    assert test_db.get_positions()[("SBIN", "M")]["net_qty"] == 5
+
+def test_db_cache_sees_writes_from_another_connection(test_db):
+    assert test_db.get_state("paper_trading_mode") is None
+    other = TradingDatabase(db_path=str(test_db.db_path))
+    try:
+        other.save_state("paper_trading_mode", False)
+    finally:
+        other.close()
+    assert test_db.get_state("paper_trading_mode") == "False"
+
+def test_db_flush_keeps_good_rows_next_to_a_bad_one(test_db):
+    import sqlite3
+    from core import database
+    test_db.save_order({"id": "GOOD1", "symbol": "SBIN", "qty": 1, "timestamp": "2026-01-05T10:00:00"})
+    # Wrong types: rejected by the STRICT orders table
+    test_db.save_order({"id": "BAD", "symbol": "SBIN", "qty": "lots", "price": "n/a", "timestamp": "2026-01-05T10:00:01"})
+    test_db.save_order({"id": "GOOD2", "symbol": "SBIN", "qty": 2, "timestamp": "2026-01-05T10:00:02"})
+
+    # Once flushed, visible to another connection
+    test_db.flush()
+    conn = sqlite3.connect(test_db.db_path)
+    try:
+        ids = {row[0] for row in conn.execute("SELECT id FROM orders")}
+    finally:
+        conn.close()
+    assert {"GOOD1", "GOOD2"} <= ids
+    if database._STRICT:
+        assert "BAD" not in ids
@@ -0,0 +1,131 @@
+import orjson
+from core.market_data import MarketDataAggregator
+
+def test_publish_updates_latest_prices():
+    md = MarketDataAggregator()
+    md.publish("SBIN", {"symbol": "SBIN", "ltp": 100.0})
+    assert md.get_price("SBIN")["ltp"] == 100.0
+
+def test_snapshot_cached_until_next_publish():
+    md = MarketDataAggregator()
+    md.publish("SBIN", {"symbol": "SBIN", "ltp": 100.0})
+    
+    first = md.get_latest_prices()
+    assert md.get_latest_prices() is first
+    assert md.snapshot_json() is md.snapshot_json()
+    
+    md.publish("SBIN", {"symbol": "SBIN", "ltp": 101.0})
+    second = md.get_latest_prices()
+    assert second is not first
+    assert second["SBIN"]["ltp"] == 101.0
+    assert orjson.loads(md.snapshot_json())["SBIN"]["ltp"] == 101.0
+
+def test_prices_body_rebuilt_only_on_change():
+    md = MarketDataAggregator()
+    md.publish("SBIN", {"symbol": "SBIN", "ltp": 100.0})
+    
+    body = md.cached_prices_json()
+    assert md.cached_prices_json() is body
+    assert orjson.loads(body)["prices"]["SBIN"]["ltp"] == 100.0
+    
+    md.publish("SBIN", {"symbol": "SBIN", "ltp": 101.0})
+    assert orjson.loads(md.cached_prices_json())["prices"]["SBIN"]["ltp"] == 101.0
+
+def test_iso_now_is_second_resolution():
+    import time
+    from datetime import datetime
+    from core.market_data import iso_now
+    
+    before = int(time.time())
+    text = iso_now()
+    assert text in {datetime.fromtimestamp(before + d).isoformat() for d in (0, 1)}
+
+def test_symbol_versions_track_last_write():
+    md = MarketDataAggregator()
+    md.publish("SBIN", {"symbol": "SBIN", "ltp": 100.0})
+    md.publish("INFY", {"symbol": "INFY", "ltp": 1500.0})
+    sbin = md.symbol_versions["SBIN"]
+    
+    md.publish("INFY", {"symbol": "INFY", "ltp": 1501.0})
+    assert md.symbol_versions["SBIN"] == sbin
+    assert md.symbol_versions["INFY"] > sbin
+
+def test_delta_sends_only_changed_fields():
+    last_sent = {}
+    first = orjson.loads(MarketDataAggregator.encode_delta(
+        {"SBIN": {"symbol": "SBIN", "ltp": 100.0, "volume": 5}}, last_sent))
+    assert first == {"type": "delta", "u": {"SBIN": {"l": 100.0, "v": 5}}}
+    
+    second = orjson.loads(MarketDataAggregator.encode_delta(
+        {"SBIN": {"symbol": "SBIN", "ltp": 100.5, "volume": 5}}, last_sent))
+    assert second["u"] == {"SBIN": {"l": 100.5}}
+    
+    assert MarketDataAggregator.encode_delta(
+        {"SBIN": {"symbol": "SBIN", "ltp": 100.5, "volume": 5}}, last_sent) is None
+
+def test_numpy_values_serialize():
+    import numpy as np
+    md = MarketDataAggregator()
+    md.publish("SBIN", {"symbol": "SBIN", "ltp": np.float32(100.5), "volume": np.int64(5)})
+    assert orjson.loads(md.snapshot_json())["SBIN"] == {"symbol": "SBIN", "ltp": 100.5, "volume": 5}
+    
+    frame = MarketDataAggregator.encode_delta(md.latest_prices, {})
+    assert orjson.loads(frame)["u"]["SBIN"] == {"l": 100.5, "v": 5}
+
+def test_delta_skips_timestamp_only_change():
+    last_sent = {}
+    MarketDataAggregator.encode_delta({"SBIN": {"symbol": "SBIN", "ltp": 100.0, "timestamp": 1.0}}, last_sent)
+    
+    assert MarketDataAggregator.encode_delta(
+        {"SBIN": {"symbol": "SBIN", "ltp": 100.0, "timestamp": 2.0}}, last_sent) is None
+    
+    frame = MarketDataAggregator.encode_delta(
+        {"SBIN": {"symbol": "SBIN", "ltp": 100.5, "timestamp": 3.0}}, last_sent)
+    assert orjson.loads(frame)["u"] == {"SBIN": {"l": 100.5, "ts": 3.0}}
+
+def test_snapshot_frame_shared_until_next_publish():
+    md = MarketDataAggregator()
+    md.publish("SBIN", {"symbol": "SBIN", "ltp": 100.0})
+    
+    frame = md.snapshot_frame()
+    assert md.snapshot_frame() is frame
+    decoded = orjson.loads(frame)
+    assert decoded["type"] == "snapshot"
+    assert decoded["data"]["SBIN"]["ltp"] == 100.0
+    assert orjson.loads(md.snapshot_frame("reconcile"))["type"] == "reconcile"
+    
+    md.publish("SBIN", {"symbol": "SBIN", "ltp": 101.0})
+    assert orjson.loads(md.snapshot_frame())["data"]["SBIN"]["ltp"] == 101.0
+
+def test_large_frames_compressed_once():
+    import zlib
+    from core.market_data import compress_frame
+    
+    small = b'{"type":"delta","u":{}}'
+    assert compress_frame(small) is small
+    
+    md = MarketDataAggregator()
+    for i in range(100):
+        md.publish(f"SYM{i}", {"symbol": f"SYM{i}", "ltp": 100.0 + i, "volume": i})
+    frame = md.snapshot_frame()
+    assert frame[:1] == b"x"
+    assert orjson.loads(zlib.decompress(frame))["data"]["SYM5"]["ltp"] == 105.0
+    assert md.snapshot_frame() is frame
+
+def test_ui_active_follows_clients_and_reads():
+    md = MarketDataAggregator()
+    assert not md.ui_active
+    md.set_ws_clients(1)
+    assert md.ui_active
+    md.set_ws_clients(0)
+    assert not md.ui_active
+    md.get_price("SBIN")
+    assert md.ui_active
+
+def test_store_updates_without_notifying():
+    md = MarketDataAggregator()
+    notified = []
+    md._loop = type("Loop", (), {"call_soon_threadsafe": lambda self, cb, s: notified.append(s)})()
+    md.store("SBIN", {"symbol": "SBIN", "ltp": 100.0})
+    assert md.latest_prices["SBIN"]["ltp"] == 100.0
+    assert md.symbol_versions["SBIN"] == 1 and not notified
@@ -0,0 +1,21 @@
+import json
+from core.paper_trading import PaperTradingEngine
+
+def test_legacy_history_migrated_and_appended(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+    (tmp_path / "logs" / "paper_trades.json").write_text(json.dumps([
+        {"entry_time": "2026-01-05T09:20:00", "exit_time": "2026-01-05T09:25:00", "pnl": 100.0, "status": "CLOSED"}
+    ]))
+    
+    engine = PaperTradingEngine()
+    assert not (tmp_path / "logs" / "paper_trades.json").exists()
+    assert len(engine.recent_trades()) == 1
+    
+    engine.enter_position("BUY_CE", 50000.0, 50000, 15, "test")
+    engine.exit_position(50010.0, "test")
+    
+    trades = engine.recent_trades(limit=1)
+    assert len(trades) == 1
+    assert trades[0]["pnl"] == 150.0
+    assert engine.get_daily_pnl()["total_trades"] == 1
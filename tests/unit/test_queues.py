@@ -0,0 +1,25 @@
+import queue
+import threading
+
+import pytest
+
+from core.queues import RingQueue
+
+def test_ring_queue_drops_oldest_when_full():
+    q = RingQueue(3)
+    for i in range(5):
+        q.put(i)
+
+    assert q.qsize() == 3 and q.dropped == 2
+    assert [q.get_nowait() for _ in range(3)] == [2, 3, 4]
+    with pytest.raises(queue.Empty):
+        q.get(timeout=0.01)
+
+def test_ring_queue_get_wakes_on_put():
+    q = RingQueue(4)
+    got = []
+    t = threading.Thread(target=lambda: got.append(q.get(timeout=5)))
+    t.start()
+    q.put("msg")
+    t.join(5)
+    assert got == ["msg"]
@@ -17,6 +17,19 @@ def test_weightage_strength_calc(weightage_calc):
     # 50% weight * 1% change = 50.0 total strength (using whole numbers)
     assert strength == 50.0
 
+def test_weightage_ignores_symbols_without_open_and_tracks_updates():
+    wc = WeightageCalculator(weights={"HDFCBANK": 50.0, "ICICIBANK": 50.0})
+    assert wc.calculate_weighted_strength() == 0.0
+    wc.set_open_price("HDFCBANK", 0.0)
+    wc.update_data("HDFCBANK", 1010)
+    assert wc.calculate_weighted_strength() == 0.0  # zero open contributes nothing
+    wc.set_open_price("HDFCBANK", 1000)
+    wc.update_data("ICICIBANK", 500, is_open=True)
+    wc.update_data("ICICIBANK", 495)
+    assert wc.calculate_weighted_strength() == 50.0 - 50.0
+    wc.update_data("UNKNOWN", 1)
+    assert wc.calculate_weighted_strength() == 0.0
+
 def test_strategy_momentum_boost():
     wc = WeightageCalculator(weights={})
     # Threshold 2.5, Confirmation 1, min_hold_time 0 (for simple test)
@@ -72,3 +85,17 @@ def test_strategy_exit_logic():
     assert signal is not None
     assert signal.type == "EXIT"
     assert strat.position is None
+
+def test_macro_trend_kernel_matches_pandas():
+    import numpy as np
+    import pandas as pd
+    from core.strategy import TechnicalIndicators
+
+    close = 100 + np.cumsum(np.random.default_rng(7).normal(size=120))
+    series = pd.Series(close)
+    result = TechnicalIndicators.macro_trend(close)
+
+    assert result['sma'] == round(series.rolling(50).mean().iloc[-1], 2)
+    assert result['rsi'] == round(TechnicalIndicators.calculate_rsi(series, 14).iloc[-1], 2)
+    assert result['trend'] == ("BULLISH" if close[-1] > result['sma'] else "BEARISH")
+    assert TechnicalIndicators.macro_trend(close[:49])['trend'] == 'NEUTRAL'
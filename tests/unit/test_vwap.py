@@ -0,0 +1,27 @@
+import math
+
+from core.vwap import VwapBook
+
+def test_vwap_uses_cumulative_volume_deltas():
+    book = VwapBook()
+    assert math.isnan(book.update("SBIN", 100.0, 0))
+    assert book.update("SBIN", 100.0, 10) == 100.0
+    # Same cumulative volume again: no new trades, VWAP unchanged
+    assert book.update("SBIN", 130.0, 10) == 100.0
+    assert book.update("SBIN", 130.0, 20) == 115.0
+    assert book.get("SBIN") == (20, 115.0)
+
+def test_vwap_seed_and_growth():
+    book = VwapBook(capacity=2)
+    book.seed("HDFCBANK", 100, 10_000.0, last_vol=100)
+    for i in range(5):
+        book.update(f"SYM{i}", 1.0 + i, 1)
+    assert book.update("HDFCBANK", 200.0, 200) == 150.0
+    assert book.get("SYM4") == (1, 5.0)
+    assert book.get("UNKNOWN")[0] == 0
+
+def test_update_at_uses_preassigned_id():
+    book = VwapBook()
+    idx = book.index("SBIN")
+    assert book.update_at(idx, 100.0, 10) == 100.0
+    assert book.update("SBIN", 130.0, 20) == 115.0